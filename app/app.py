@@ -1,6 +1,6 @@
 import streamlit as st
-import pandas as pd
 import os
+import sys
 
 # --------------------------------------------------
 # Page Config (MUST BE FIRST)
@@ -64,9 +64,13 @@ st.markdown(
 # --------------------------------------------------
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 data_path = os.path.join(BASE_DIR, "data", "ev_charging_data.csv")
-df = pd.read_csv(data_path)
 
-stations = sorted(df["station_id"].unique())
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+from ev_intelligence.cache import cache_stats, get_station_ids
+
+stations = get_station_ids(data_path)
 
 # --------------------------------------------------
 # Sidebar (Minimal – Only What’s Needed)
@@ -100,6 +104,9 @@ with st.sidebar:
 
     st.caption("EV Demand Intelligence Platform v1.0")
 
+    stats = cache_stats()
+    st.caption(f"Cache: {stats['hits'].sum()} hits / {stats['misses'].sum()} misses")
+
 # --------------------------------------------------
 # Page Header
 # --------------------------------------------------
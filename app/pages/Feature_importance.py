@@ -1,6 +1,6 @@
 import streamlit as st
-import joblib
 import os
+import sys
 import pandas as pd
 import plotly.express as px
 with st.sidebar:
@@ -29,14 +29,25 @@ st.title("🧠 Model Explainability")
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 model_path = os.path.join(BASE_DIR, "models", "ev_demand_model.pkl")
 
-model = joblib.load(model_path)
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
 
-if not hasattr(model, "feature_importances_"):
+from ev_intelligence.cache import get_model_metadata
+from ev_intelligence.model_registry import current_model_path
+
+# Serve the registry's current version (re-read on every run, so a promoted
+# version goes live without restarting the app)
+model_path = current_model_path(model_path)
+
+# Sidecar metadata only; the forest itself is never loaded on this page
+model_metadata = get_model_metadata(model_path)
+
+if model_metadata["feature_importances"] is None:
     st.warning("Current model does not support feature importance.")
     st.stop()
 
-feature_names = model.feature_names_in_
-importances = model.feature_importances_
+feature_names = model_metadata["feature_names"]
+importances = model_metadata["feature_importances"]
 
 importance_df = pd.DataFrame({
     "Feature": feature_names,
@@ -1,8 +1,8 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import joblib
 import os
+import sys
 import plotly.express as px
 
 # Sidebar Branding
@@ -18,13 +18,37 @@ st.markdown("<hr style='border:1px solid #2c2f36;'>", unsafe_allow_html=True)
 # --------------------------------------------------
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 data_path = os.path.join(BASE_DIR, "data", "ev_charging_data.csv")
+metadata_path = os.path.join(BASE_DIR, "data", "station_metadata.csv")
 model_path = os.path.join(BASE_DIR, "models", "ev_demand_model.pkl")
 
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+from ev_intelligence.cache import (
+    fingerprint,
+    get_demand_tensor,
+    get_metadata,
+    get_model,
+    get_online_stats,
+    get_residual_stats
+)
+from ev_intelligence.feature_state import FeatureState
+from ev_intelligence.forecast_cache import forecast_cache
+from ev_intelligence.fast_forest import flattened
+from ev_intelligence.forecasting import ensemble_forecast, recursive_forecast
+from ev_intelligence.residuals import station_band
+from ev_intelligence.scenarios import DEFAULT_SCENARIO, simulate
+from ev_intelligence.model_registry import current_model_path
+
+# Serve the registry's current version (re-read on every run, so a promoted
+# version goes live without restarting the app)
+model_path = current_model_path(model_path)
+
 # --------------------------------------------------
 # Load Data & Model
 # --------------------------------------------------
-df = pd.read_csv(data_path)
-model = joblib.load(model_path)
+demand = get_demand_tensor(data_path, metadata_path)
+model = get_model(model_path)
 
 selected_station = st.session_state.get("selected_station", None)
 
@@ -33,35 +57,17 @@ if selected_station is None:
     st.stop()
 
 # --------------------------------------------------
-# Filter Station
+# Station State
 # --------------------------------------------------
-df = df[df["station_id"] == selected_station].copy()
-
-df["datetime"] = pd.to_datetime(df["date"]) + pd.to_timedelta(df["hour"], unit="h")
-df = df.sort_values("datetime")
+online_stats = get_online_stats(data_path, metadata_path)
+station_summary = online_stats.summary(selected_station)
 
-# --------------------------------------------------
-# Feature Engineering
-# --------------------------------------------------
-df["lag_1"] = df["energy_kwh"].shift(1)
-df["lag_24"] = df["energy_kwh"].shift(24)
-df["rolling_mean_3"] = df["energy_kwh"].rolling(3).mean()
-df["day_of_week"] = df["datetime"].dt.weekday
-df["is_weekend"] = (df["day_of_week"] >= 5).astype(int)
-
-df = df.dropna()
-df["station_id"] = selected_station
-
-df_encoded = pd.get_dummies(df, columns=["station_id"], drop_first=True)
+if station_summary is None:
+    st.warning(f"No charging history recorded for {selected_station} yet.")
+    st.stop()
 
 feature_cols = model.feature_names_in_
 
-for col in feature_cols:
-    if col not in df_encoded.columns:
-        df_encoded[col] = 0
-
-df_encoded = df_encoded[feature_cols]
-
 # --------------------------------------------------
 # Forecast Controls
 # --------------------------------------------------
@@ -89,21 +95,24 @@ if horizon > 48:
 # --------------------------------------------------
 # Recursive Forecast with Growth Adjustment
 # --------------------------------------------------
-latest_row = df_encoded.iloc[-1:].copy()
-
-forecast_values = []
-current_row = latest_row.copy()
-
-for _ in range(horizon):
-    pred = model.predict(current_row)[0]
-
-    # Apply growth assumption
-    adjusted_pred = pred * (1 + growth_factor / 100)
-
-    forecast_values.append(adjusted_pred)
+# Cached per (station, growth, model, data); a longer horizon serves shorter ones
+forecast_key = forecast_cache.key(
+    selected_station,
+    growth_factor,
+    model.version,
+    fingerprint(data_path)
+)
 
-    current_row["lag_1"] = adjusted_pred
-    current_row["hour"] = (current_row["hour"] + 1) % 24
+forecast_values = forecast_cache.get_or_compute(
+    forecast_key,
+    horizon,
+    lambda steps: recursive_forecast(
+        model,
+        FeatureState.from_tensor(demand, feature_cols, [selected_station]),
+        steps,
+        growth_factor=growth_factor
+    )[0]
+)
 
 forecast_df = pd.DataFrame({
     "Hour Ahead": range(1, horizon + 1),
@@ -113,16 +122,17 @@ forecast_df = pd.DataFrame({
 # --------------------------------------------------
 # Risk Classification
 # --------------------------------------------------
-historical_mean = df["energy_kwh"].mean()
-historical_std = df["energy_kwh"].std()
-historical_peak = df["energy_kwh"].max()
+# Thresholds read from the streaming per-station state
+thresholds = online_stats.risk_thresholds(selected_station)
+historical_mean = station_summary["mean"]
+historical_peak = thresholds["high"]
 
 avg_forecast = np.mean(forecast_values)
 peak_forecast = np.max(forecast_values)
 
 if peak_forecast >= historical_peak:
     risk_level = "🔴 High Load Risk"
-elif peak_forecast >= historical_mean + historical_std:
+elif peak_forecast >= thresholds["moderate"]:
     risk_level = "🟡 Moderate Load Risk"
 else:
     risk_level = "🟢 Low Load Risk"
@@ -154,13 +164,43 @@ st.markdown("---")
 # --------------------------------------------------
 # Confidence Interval
 # --------------------------------------------------
-historical_preds = model.predict(df_encoded)
-historical_actuals = df["energy_kwh"].values
-
-residual_std = np.std(historical_actuals - historical_preds)
+# Per-station, per-hour residual std stored with the model at training time
+residual_stats = get_residual_stats(model_path, data_path)
+
+if flattened(model) is not None:
+    # P10 / P90 across one recursive trajectory per tree (plus residual
+    # noise), so the band widens with the horizon
+    quantile_key = forecast_cache.key(
+        selected_station,
+        growth_factor,
+        model.version,
+        fingerprint(data_path),
+        kind="p10_p50_p90"
+    )
+
+    quantile_values = forecast_cache.get_or_compute(
+        quantile_key,
+        horizon,
+        lambda steps: ensemble_forecast(
+            model,
+            FeatureState.from_tensor(demand, feature_cols, [selected_station]),
+            steps,
+            growth_factor=growth_factor,
+            residual_stats=residual_stats
+        )[0].T
+    )
+
+    forecast_df["Lower Bound"] = quantile_values[:, 0]
+    forecast_df["Upper Bound"] = quantile_values[:, 2]
+    band_label = "P10 / P90 of per-tree trajectories with residual noise"
+else:
+    last_hour = online_stats.last_timestamp(selected_station).astype(np.int64) % 24
+    forecast_hours = last_hour + np.arange(1, horizon + 1)
+    residual_std = station_band(residual_stats, selected_station, forecast_hours)
 
-forecast_df["Upper Bound"] = forecast_df["Predicted Demand"] + residual_std
-forecast_df["Lower Bound"] = forecast_df["Predicted Demand"] - residual_std
+    forecast_df["Upper Bound"] = forecast_df["Predicted Demand"] + residual_std
+    forecast_df["Lower Bound"] = forecast_df["Predicted Demand"] - residual_std
+    band_label = "± residual std"
 
 # --------------------------------------------------
 # Plot Forecast
@@ -199,11 +239,11 @@ fig.update_layout(
 fig.update_traces(line=dict(width=3))
 
 st.plotly_chart(fig, use_container_width=True)
+st.caption(f"Confidence band: {band_label}")
 # --------------------------------------------------
 # Load Station Metadata
 # --------------------------------------------------
-metadata_path = os.path.join(BASE_DIR, "data", "station_metadata.csv")
-metadata = pd.read_csv(metadata_path)
+metadata = get_metadata(metadata_path)
 
 station_info = metadata[metadata["station_id"] == selected_station].iloc[0]
 capacity_kw = station_info["capacity_kw"]
@@ -233,3 +273,86 @@ st.metric("Infrastructure Status", infra_risk)
 # --------------------------------------------------
 peak_hour = forecast_df["Predicted Demand"].idxmax() + 1
 st.success(f"Predicted Peak within next {horizon} hours at Hour +{peak_hour}")
+
+# --------------------------------------------------
+# Monte Carlo Scenarios
+# --------------------------------------------------
+st.markdown("---")
+st.subheader("🎲 Monte Carlo Scenarios")
+
+colM1, colM2, colM3, colM4 = st.columns(4)
+n_paths = colM1.select_slider("Paths", options=[200, 500, 1000, 2000], value=1000)
+growth_sd = colM2.slider("Growth Uncertainty (± %)", 0.0, 20.0, DEFAULT_SCENARIO["growth_sd"], 1.0)
+stress_sigma = colM3.slider("Daily Stress (σ)", 0.0, 0.5, DEFAULT_SCENARIO["stress_sigma"], 0.05)
+weather_sigma = colM4.slider("Weather Shock (σ)", 0.0, 0.3, DEFAULT_SCENARIO["weather_sigma"], 0.01)
+
+# Expected growth comes from the forecast controls above
+scenario = {
+    "growth_mean": growth_factor,
+    "growth_sd": growth_sd,
+    "stress_sigma": stress_sigma,
+    "weather_sigma": weather_sigma
+}
+
+scenario_key = forecast_cache.key(
+    selected_station,
+    growth_factor,
+    model.version,
+    fingerprint(data_path),
+    kind=f"mc:{n_paths}:{growth_sd}:{stress_sigma}:{weather_sigma}"
+)
+
+
+def run_scenarios(steps):
+    result = simulate(
+        model,
+        FeatureState.from_tensor(demand, feature_cols, [selected_station]),
+        steps,
+        capacity=[capacity_kw],
+        peak=[historical_peak],
+        n_paths=n_paths,
+        scenario=scenario,
+        seed=0
+    )
+    return np.column_stack([
+        result["quantiles"][0].T,
+        result["p_medium"][0],
+        result["p_high"][0],
+        result["p_over_peak"][0]
+    ])
+
+
+scenario_values = forecast_cache.get_or_compute(scenario_key, horizon, run_scenarios)
+
+scenario_df = pd.DataFrame({
+    "Hour Ahead": range(1, horizon + 1),
+    "P(Above Historical Peak)": scenario_values[:, 5],
+    "P(≥ 70% Capacity)": scenario_values[:, 3],
+    "P(≥ 100% Capacity)": scenario_values[:, 4]
+})
+
+colS1, colS2, colS3 = st.columns(3)
+colS1.metric("Worst-Hour P(Above Peak)", f"{scenario_values[:, 5].max():.1%}")
+colS2.metric("Worst-Hour P(≥ 70% Capacity)", f"{scenario_values[:, 3].max():.1%}")
+colS3.metric("P90 Peak Demand (kWh)", round(scenario_values[:, 2].max(), 2))
+
+fig_mc = px.line(
+    scenario_df,
+    x="Hour Ahead",
+    y=["P(Above Historical Peak)", "P(≥ 70% Capacity)", "P(≥ 100% Capacity)"],
+    title=f"Overload Probability across {n_paths} Simulated Paths"
+)
+
+fig_mc.update_layout(
+    template="plotly_dark",
+    paper_bgcolor="#0e1117",
+    plot_bgcolor="#0e1117",
+    font=dict(color="white"),
+    yaxis_title="Probability",
+    yaxis_tickformat=".0%",
+    legend_title_text=""
+)
+
+st.plotly_chart(fig_mc, use_container_width=True)
+st.caption("Each path samples a growth level, a daily stress multiplier and a persistent hourly weather shock, "
+           "and follows one tree of the forest.")
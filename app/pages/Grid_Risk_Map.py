@@ -1,8 +1,8 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import joblib
 import os
+import sys
 import plotly.express as px
 
 # --------------------------------------------------
@@ -22,93 +22,127 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__fil
 data_path = os.path.join(BASE_DIR, "data", "ev_charging_data.csv")
 metadata_path = os.path.join(BASE_DIR, "data", "station_metadata.csv")
 model_path = os.path.join(BASE_DIR, "models", "ev_demand_model.pkl")
+risk_snapshot_path = os.path.join(BASE_DIR, "data", "live", "risk_snapshot.parquet")
+
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+from ev_intelligence.cache import (
+    get_demand_tensor,
+    get_fleet_forecast,
+    get_metadata,
+    get_redistribution_planner,
+    get_risk_snapshot,
+    get_spatial_index
+)
+from ev_intelligence.model_registry import current_model_path
+from ev_intelligence.redistribution import MAX_DISTANCE_KM, RECEIVER_LIMIT, TARGET_UTILIZATION
+from ev_intelligence.spatial import MAX_ZOOM, fit_view, viewport
+
+# Serve the registry's current version (re-read on every run, so a promoted
+# version goes live without restarting the app)
+model_path = current_model_path(model_path)
+
+# Map size used to work out the visible area
+MAP_WIDTH_PX = 1000
+MAP_HEIGHT_PX = 600
 
 # --------------------------------------------------
 # Load Data
 # --------------------------------------------------
-df = pd.read_csv(data_path)
-metadata = pd.read_csv(metadata_path)
-model = joblib.load(model_path)
-
-results = []
+demand = get_demand_tensor(data_path, metadata_path)
+metadata = get_metadata(metadata_path)
+spatial_index = get_spatial_index(metadata_path)
 
 # --------------------------------------------------
-# Forecast For All Stations (24h Peak)
+# Map View
 # --------------------------------------------------
-for station in df["station_id"].unique():
-
-    station_df = df[df["station_id"] == station].copy()
-
-    station_df["datetime"] = pd.to_datetime(station_df["date"]) + pd.to_timedelta(station_df["hour"], unit="h")
-    station_df = station_df.sort_values("datetime")
-
-    # Feature Engineering
-    station_df["lag_1"] = station_df["energy_kwh"].shift(1)
-    station_df["lag_24"] = station_df["energy_kwh"].shift(24)
-    station_df["rolling_mean_3"] = station_df["energy_kwh"].rolling(3).mean()
-    station_df["day_of_week"] = station_df["datetime"].dt.weekday
-    station_df["is_weekend"] = (station_df["day_of_week"] >= 5).astype(int)
-
-    station_df = station_df.dropna()
-
-    station_df["station_id"] = station
+with st.sidebar:
+    st.markdown("### 🧭 Map View")
 
-    encoded = pd.get_dummies(station_df, columns=["station_id"], drop_first=True)
+    growth_factor = st.number_input(
+        "Demand Growth Scenario (%)",
+        min_value=0,
+        max_value=1000,
+        value=0,
+        step=25,
+        help="Applied at every forecast step, as on the Forecast Intelligence page"
+    )
 
-    feature_cols = model.feature_names_in_
+    focus = st.selectbox("Focus Area", ["All Stations"] + sorted(metadata["area"].unique()))
+    focus_rows = metadata if focus == "All Stations" else metadata[metadata["area"] == focus]
 
-    for col in feature_cols:
-        if col not in encoded.columns:
-            encoded[col] = 0
+    center_lat, center_lon, fit_zoom = fit_view(
+        focus_rows["latitude"], focus_rows["longitude"], MAP_WIDTH_PX, MAP_HEIGHT_PX
+    )
+    zoom = st.slider("Zoom", min_value=1, max_value=MAX_ZOOM, value=max(fit_zoom, 1))
 
-    encoded = encoded[feature_cols]
+# --------------------------------------------------
+# Forecast For All Stations (24h Peak)
+# --------------------------------------------------
+# Without a growth scenario the live service's snapshot is used while it is
+# at least as recent as the stored history. Otherwise every station is
+# forecast once per model, data version and growth, with growth compounded
+# through the recursive forecast
+snapshot = get_risk_snapshot(risk_snapshot_path)
+newest_reading = demand.first_day.astype("datetime64[h]") + demand.last_index.max()
+live = growth_factor == 0 and snapshot is not None and snapshot["last_reading"].max() >= newest_reading
+
+if live:
+    peaks = snapshot[["station_id", "predicted_peak"]].rename(
+        columns={"predicted_peak": "peak_forecast"}
+    )
+    # Only the 24h peak is known per station, planned as a single period
+    planning_ids, planning_demand = peaks["station_id"].to_numpy(), peaks[["peak_forecast"]].to_numpy()
+    st.caption(f"Live risk snapshot, updated {snapshot['updated_at'].max()}")
+else:
+    fleet = get_fleet_forecast(model_path, data_path, metadata_path, growth_factor=growth_factor)
+    peaks = pd.DataFrame({
+        "station_id": fleet["station_id"],
+        "peak_forecast": fleet["forecast"].max(axis=1)
+    })
+    planning_ids, planning_demand = fleet["station_id"], fleet["forecast"]
+    if growth_factor > 0:
+        st.caption(f"24h fleet forecast assuming {growth_factor}% higher EV usage")
 
-    latest_row = encoded.iloc[-1:].copy()
+# Metadata row order, matching the spatial index
+map_df = metadata.merge(peaks, on="station_id", how="left")
 
-    forecast_values = []
-    current_row = latest_row.copy()
+utilization = (map_df["peak_forecast"] / map_df["capacity_kw"]) * 100
 
-    # Fixed 24-hour forecast
-    for _ in range(24):
-        pred = model.predict(current_row)[0]
-        forecast_values.append(pred)
-        current_row["lag_1"] = pred
-        current_row["hour"] = (current_row["hour"] + 1) % 24
+view = viewport(center_lat, center_lon, zoom, MAP_WIDTH_PX, MAP_HEIGHT_PX)
 
-    peak_forecast = max(forecast_values)
+# One marker per grid cell in view, aggregated server-side
+cells = spatial_index.aggregate(zoom, utilization.to_numpy(), map_df["peak_forecast"].to_numpy(), view)
 
-    # Get Metadata
-    station_info = metadata[metadata["station_id"] == station].iloc[0]
-    capacity = station_info["capacity_kw"]
+# Cells whose stations have no forecast yet are not drawn
+cells = cells.dropna(subset=["utilization"]).reset_index(drop=True)
 
-    utilization = (peak_forecast / capacity) * 100
+cells["risk"] = np.select(
+    [cells["utilization"] < 70, cells["utilization"] < 90],
+    ["Low", "Moderate"],
+    default="High"
+)
 
-    if utilization < 70:
-        risk = "Low"
-    elif utilization < 90:
-        risk = "Moderate"
-    else:
-        risk = "High"
+worst = map_df.iloc[cells["station_index"].to_numpy(dtype=int)]
+single = cells["count"].to_numpy() == 1
 
-    results.append({
-        "station_id": station,
-        "area": station_info["area"],
-        "zone": station_info["zone"],
-        "latitude": station_info["latitude"],
-        "longitude": station_info["longitude"],
-        "peak_forecast": round(peak_forecast, 2),
-        "capacity_kw": capacity,
-        "utilization_pct": round(utilization, 2),
-        "risk": risk
-    })
+cells["title"] = np.where(single, worst["area"], cells["count"].astype(str) + " stations")
+cells["detail"] = np.where(single, "Zone: " + worst["zone"].astype(str), "Worst: " + worst["station_id"])
+cells["capacity_kw"] = worst["capacity_kw"].to_numpy()
+cells["peak_forecast"] = cells["peak_forecast"].round(2)
+cells["utilization_pct"] = cells["utilization"].round(2)
 
-map_df = pd.DataFrame(results)
+st.caption(
+    f"{len(cells)} markers for {int(cells['count'].sum())} of {len(metadata)} stations in view "
+    f"(zoom {zoom})"
+)
 
 # --------------------------------------------------
 # Map Visualization
 # --------------------------------------------------
 fig = px.scatter_mapbox(
-    map_df,
+    cells,
     lat="latitude",
     lon="longitude",
     size="peak_forecast",
@@ -118,8 +152,16 @@ fig = px.scatter_mapbox(
         "Moderate": "#F1C40F",
         "High": "#E74C3C"
     },
-    zoom=10,
-    height=600,
+    custom_data=[
+        "title",
+        "detail",
+        "peak_forecast",
+        "capacity_kw",
+        "utilization_pct"
+    ],
+    center={"lat": center_lat, "lon": center_lon},
+    zoom=zoom,
+    height=MAP_HEIGHT_PX,
     mapbox_style="carto-darkmatter"
 )
 
@@ -127,21 +169,12 @@ fig.update_traces(
     marker=dict(sizemode="area", opacity=0.85),
     hovertemplate=
     "<b>%{customdata[0]}</b><br>"
-    "Zone: %{customdata[1]}<br>"
-    "Station ID: %{customdata[2]}<br>"
+    "%{customdata[1]}<br>"
     "<br>"
-    "Forecast Peak: %{customdata[3]} kWh<br>"
-    "Capacity: %{customdata[4]} kW<br>"
-    "Utilization: %{customdata[5]}%<br>"
-    "<extra></extra>",
-    customdata=map_df[[
-        "area",
-        "zone",
-        "station_id",
-        "peak_forecast",
-        "capacity_kw",
-        "utilization_pct"
-    ]]
+    "Forecast Peak: %{customdata[2]} kWh<br>"
+    "Capacity: %{customdata[3]} kW<br>"
+    "Utilization: %{customdata[4]}%<br>"
+    "<extra></extra>"
 )
 
 fig.update_layout(
@@ -151,3 +184,51 @@ fig.update_layout(
 )
 
 st.plotly_chart(fig, use_container_width=True)
+
+# --------------------------------------------------
+# Load Redistribution Plan
+# --------------------------------------------------
+st.markdown("---")
+st.subheader("🔀 Load Redistribution Plan")
+
+planner = get_redistribution_planner(metadata_path)
+plan = planner.plan(planner.demand_matrix(planning_ids, planning_demand))
+transfers = plan["transfers"]
+
+if live:
+    st.info(
+        "Planned on the live snapshot: each station's 24h forecast peak is treated as a single period, "
+        "so transfers cover the peak hour rather than an hour-by-hour schedule."
+    )
+else:
+    st.info("Planned hour by hour over the 24h fleet forecast.")
+
+colR1, colR2, colR3, colR4 = st.columns(4)
+colR1.metric("Overloaded Stations", int(plan["overloaded"].any(axis=1).sum()))
+colR2.metric("Suggested Transfers", len(transfers))
+colR3.metric("Load Moved (kWh)", round(transfers["transfer_kwh"].sum(), 1))
+colR4.metric("Unresolved (kWh)", round(plan["unresolved_kwh"].sum(), 1))
+
+if not plan["overloaded"].any():
+    st.success("No station reaches HIGH utilization in the forecast. No redistribution needed.")
+else:
+    table = transfers.nlargest(200, "transfer_kwh")
+    if live:
+        table = table.drop(columns="hour_ahead")
+    table = table.rename(columns={
+        "from_station": "From",
+        "to_station": "To",
+        "hour_ahead": "Hour Ahead",
+        "distance_km": "Distance (km)",
+        "transfer_kwh": "Transfer (kWh)",
+        "from_utilization_before": "From Utilization Before",
+        "from_utilization_after": "From Utilization After",
+        "to_utilization_after": "To Utilization After"
+    })
+    st.dataframe(table.round(2), use_container_width=True, hide_index=True)
+
+st.caption(
+    f"Overloaded stations shed load down to {TARGET_UTILIZATION:.0%} of capacity to their nearest neighbours "
+    f"within {MAX_DISTANCE_KM:g} km, in proportion to each neighbour's headroom; no neighbour is planned "
+    f"above {RECEIVER_LIMIT:.0%} utilization."
+)
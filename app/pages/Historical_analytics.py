@@ -1,6 +1,6 @@
 import streamlit as st
-import pandas as pd
 import os
+import sys
 import plotly.express as px
 with st.sidebar:
     st.markdown("## ⚡ EV Intelligence")
@@ -28,7 +28,10 @@ st.markdown("<hr style='border:1px solid rgba(255,255,255,0.1);'>", unsafe_allow
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 data_path = os.path.join(BASE_DIR, "data", "ev_charging_data.csv")
 
-df = pd.read_csv(data_path)
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+from ev_intelligence.cache import get_demand_tensor, get_rollups
 
 selected_station = st.session_state.get("selected_station", None)
 
@@ -36,17 +39,16 @@ if selected_station is None:
     st.warning("Select a station from main page.")
     st.stop()
 
-df = df[df["station_id"] == selected_station].copy()
-
-df["datetime"] = pd.to_datetime(df["date"]) + pd.to_timedelta(df["hour"], unit="h")
-df["day_of_week"] = pd.to_datetime(df["date"]).dt.day_name()
+# Pre-aggregated per-station tables (no raw rows needed)
+rollups = get_rollups(data_path)
+summary = rollups.summary(selected_station)
 
 # --------------------------------------------------
 # 1️⃣ Daily Trend
 # --------------------------------------------------
 st.subheader("📊 Daily Energy Trend")
 
-daily_total = df.groupby("date")["energy_kwh"].sum().reset_index()
+daily_total = rollups.daily_totals(selected_station)
 
 fig1 = px.line(
     daily_total,
@@ -64,15 +66,14 @@ st.plotly_chart(fig1, use_container_width=True)
 # --------------------------------------------------
 st.subheader("🔥 Hourly Demand Heatmap")
 
-heatmap_data = df.pivot_table(
-    values="energy_kwh",
-    index="hour",
-    columns="date",
-    aggfunc="mean"
-)
+# Hour x date slice of the memory-mapped demand tensor
+demand = get_demand_tensor(data_path)
 
 fig2 = px.imshow(
-    heatmap_data,
+    demand.heatmap(selected_station),
+    x=demand.dates,
+    y=list(range(24)),
+    labels=dict(x="date", y="hour", color="energy_kwh"),
     aspect="auto",
     color_continuous_scale="Blues"
 )
@@ -85,7 +86,7 @@ st.plotly_chart(fig2, use_container_width=True)
 # --------------------------------------------------
 st.subheader("📅 Day-of-Week Comparison")
 
-dow_avg = df.groupby("day_of_week")["energy_kwh"].mean().reset_index()
+dow_avg = rollups.day_of_week_profile(selected_station)
 
 fig3 = px.bar(
     dow_avg,
@@ -102,13 +103,18 @@ st.plotly_chart(fig3, use_container_width=True)
 # --------------------------------------------------
 st.subheader("📉 Demand Distribution")
 
-fig4 = px.histogram(
-    df,
-    x="energy_kwh",
-    nbins=30,
+histogram = rollups.histogram(selected_station)
+
+fig4 = px.bar(
+    histogram,
+    x="bin_center",
+    y="count",
+    labels=dict(bin_center="energy_kwh"),
     title="Demand Distribution"
 )
 
+fig4.update_traces(width=rollups.bin_width)
+
 fig4.update_layout(template="plotly_dark")
 st.plotly_chart(fig4, use_container_width=True)
 
@@ -142,9 +148,9 @@ st.markdown(
     unsafe_allow_html=True
 )
 
-volatility = df["energy_kwh"].std()
+volatility = summary["std"]
 st.metric("Demand Volatility (Std Dev)", round(volatility, 2))
-mean_demand = df["energy_kwh"].mean()
+mean_demand = summary["mean"]
 
 if volatility < mean_demand * 0.2:
     st.success("Low variability — station demand is highly stable.")
@@ -1,6 +1,6 @@
 import streamlit as st
-import pandas as pd
 import os
+import sys
 import plotly.express as px
 with st.sidebar:
     st.markdown("## ⚡ EV Intelligence")
@@ -44,7 +44,10 @@ st.markdown(
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 data_path = os.path.join(BASE_DIR, "data", "ev_charging_data.csv")
 
-df = pd.read_csv(data_path)
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+from ev_intelligence.cache import get_online_stats, get_rollups
 
 selected_station = st.session_state.get("selected_station", None)
 
@@ -52,16 +55,18 @@ if selected_station is None:
     st.warning("Please select a station from main page.")
     st.stop()
 
-df = df[df["station_id"] == selected_station].copy()
+# Pre-aggregated per-station tables (no raw rows needed)
+rollups = get_rollups(data_path)
+summary = rollups.summary(selected_station)
 
 # --------------------------------------------------
 # Core KPIs
 # --------------------------------------------------
 col1, col2, col3 = st.columns(3)
 
-col1.metric("Total Records", len(df))
-col2.metric("Avg Demand (kWh)", round(df["energy_kwh"].mean(), 2))
-col3.metric("Peak Demand (kWh)", round(df["energy_kwh"].max(), 2))
+col1.metric("Total Records", summary["count"])
+col2.metric("Avg Demand (kWh)", round(summary["mean"], 2))
+col3.metric("Peak Demand (kWh)", round(summary["max"], 2))
 
 st.markdown("---")
 
@@ -70,15 +75,16 @@ st.markdown("---")
 # --------------------------------------------------
 st.subheader("📊 Demand Stability Analysis")
 
-volatility = df["energy_kwh"].std()
-mean_demand = df["energy_kwh"].mean()
+# Running Welford state, no pass over the history
+online = get_online_stats(data_path).summary(selected_station)
 
-stability_score = 100 - (volatility / mean_demand) * 100
+volatility = online["std"]
+stability_score = online["stability_score"]
 
 col1, col2 = st.columns(2)
 
 col1.metric("Volatility (Std Dev)", round(volatility, 2))
-col2.metric("Stability Score", f"{round(stability_score,1)}%")
+col2.metric("Stability Score", f"{stability_score:.1f}%")
 
 if stability_score > 80:
     st.success("Station demand is highly stable.")
@@ -94,7 +100,7 @@ st.markdown("---")
 # --------------------------------------------------
 st.subheader("⏱ Peak Hour Pattern")
 
-hourly_avg = df.groupby("hour")["energy_kwh"].mean().reset_index()
+hourly_avg = rollups.hourly_profile(selected_station)
 
 peak_hour = hourly_avg.loc[hourly_avg["energy_kwh"].idxmax(), "hour"]
 
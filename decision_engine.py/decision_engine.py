@@ -1,3 +1,19 @@
+import numpy as np
+import pandas as pd
+
+# Utilization thresholds (predicted demand / capacity)
+MEDIUM_RISK_THRESHOLD = 0.7
+HIGH_RISK_THRESHOLD = 1.0
+
+RISK_LEVELS = ["LOW", "MEDIUM", "HIGH"]
+ACTIONS = [
+    "Normal operation",
+    "Monitor load and prepare mitigation",
+    "Shift charging to off-peak hours or "
+    "redistribute load to nearby stations"
+]
+
+
 def decision_engine(predicted_demand, station_capacity):
     """
     Decision Intelligence Engine
@@ -21,19 +37,68 @@ def decision_engine(predicted_demand, station_capacity):
     }
 
     # Decision rules
-    if utilization < 0.7:
+    if utilization < MEDIUM_RISK_THRESHOLD:
         decision["risk_level"] = "LOW"
-        decision["action"] = "Normal operation"
+        decision["action"] = ACTIONS[0]
 
-    elif 0.7 <= utilization < 1.0:
+    elif MEDIUM_RISK_THRESHOLD <= utilization < HIGH_RISK_THRESHOLD:
         decision["risk_level"] = "MEDIUM"
-        decision["action"] = "Monitor load and prepare mitigation"
+        decision["action"] = ACTIONS[1]
 
     else:
         decision["risk_level"] = "HIGH"
-        decision["action"] = (
-            "Shift charging to off-peak hours or "
-            "redistribute load to nearby stations"
-        )
+        decision["action"] = ACTIONS[2]
 
     return decision
+
+
+def risk_codes(utilization):
+    """
+    Risk level index per utilization ratio: 0 = LOW, 1 = MEDIUM, 2 = HIGH.
+    NaN falls through to HIGH, as in decision_engine().
+    """
+    utilization = np.asarray(utilization, dtype=float)
+
+    return np.select(
+        [utilization < MEDIUM_RISK_THRESHOLD, utilization < HIGH_RISK_THRESHOLD],
+        [0, 1],
+        default=2
+    ).astype(np.int8)
+
+
+def decision_engine_batch(predicted_demand, station_capacity=None):
+    """
+    Vectorized Decision Engine
+    --------------------------
+    Same rules as decision_engine(), applied to whole arrays at once.
+
+    Input:
+    - predicted_demand (array-like or DataFrame): forecasted demand (kWh);
+      a DataFrame must hold predicted_demand and capacity columns
+    - station_capacity (array-like or float): capacity, broadcast against
+      predicted_demand
+
+    Output:
+    - decisions (DataFrame): predicted_demand, capacity, utilization_ratio
+      (float64, unrounded), risk_level and action (categorical)
+    """
+    if isinstance(predicted_demand, pd.DataFrame):
+        station_capacity = predicted_demand["capacity"]
+        predicted_demand = predicted_demand["predicted_demand"]
+
+    demand = np.asarray(predicted_demand, dtype=float)
+    capacity = np.asarray(station_capacity, dtype=float)
+    demand, capacity = np.broadcast_arrays(demand, capacity)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        utilization = demand / capacity
+
+    codes = risk_codes(utilization).ravel()
+
+    return pd.DataFrame({
+        "predicted_demand": demand.ravel(),
+        "capacity": capacity.ravel(),
+        "utilization_ratio": utilization.ravel(),
+        "risk_level": pd.Categorical.from_codes(codes, RISK_LEVELS),
+        "action": pd.Categorical.from_codes(codes, ACTIONS)
+    })
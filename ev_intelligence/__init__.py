@@ -0,0 +1,6 @@
+"""
+EV Intelligence
+---------------
+Shared forecasting, feature and data utilities used by the Streamlit
+dashboard, the notebooks and the command-line tools.
+"""
@@ -0,0 +1,84 @@
+"""
+Atomic File Writes
+------------------
+Cache files, sidecars and snapshots are written by several processes at
+once (Streamlit sessions, the live service, batch and backtest workers, the
+prediction server). Each writer fills its own temporary file in the target
+directory and renames it over the destination, so readers only ever see a
+complete file and concurrent writers never move each other's data. The
+renamed file gets the permissions a plain open() would give a new file
+(0o666 minus the umask), since the app and the writers may run as
+different users. Directories (the flattened forest) are never replaced in
+place: each save gets a new directory and the sidecar that names it is
+the file that is swapped.
+"""
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+
+import numpy as np
+
+# Read once at import: os.umask can only be queried by setting it, which
+# would race with files being created on other threads
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+@contextmanager
+def atomic_path(path, suffix=""):
+    """
+    Yield a unique temporary path next to path; on success it replaces path,
+    on error it is removed.
+
+    Input:
+    - suffix (str): extension some writers insist on (".npz", ".npy")
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+
+    # The name ends in suffix, so np.save / np.savez do not append another
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp" + suffix, dir=directory)
+    os.close(fd)
+
+    try:
+        yield tmp_path
+        # mkstemp creates the file 0o600 and os.replace would keep that
+        os.chmod(tmp_path, 0o666 & ~_UMASK)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def unique_directory(path):
+    """
+    Create and return a new, empty directory named path.<random suffix>
+    next to path.
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+
+    new_path = tempfile.mkdtemp(prefix=f"{os.path.basename(path)}.", dir=directory)
+    # mkdtemp creates the directory 0o700
+    os.chmod(new_path, 0o777 & ~_UMASK)
+    return new_path
+
+
+def save_npy(path, array):
+    """np.save, atomically."""
+    with atomic_path(path, ".npy") as tmp_path:
+        np.save(tmp_path, array)
+
+
+def save_npz(path, **arrays):
+    """np.savez, atomically."""
+    with atomic_path(path, ".npz") as tmp_path:
+        np.savez(tmp_path, **arrays)
+
+
+def write_json(path, value, **kwargs):
+    """json.dump, atomically."""
+    with atomic_path(path) as tmp_path:
+        with open(tmp_path, "w") as f:
+            json.dump(value, f, **kwargs)
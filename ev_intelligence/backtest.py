@@ -0,0 +1,272 @@
+"""
+Walk-Forward Backtesting
+------------------------
+Replays the recursive forecaster from many historical origins: at every
+origin hour t (every `stride` hours) each station is forecast `horizon`
+hours ahead from its 24 readings up to t, exactly as the dashboard would
+have done at that moment, and compared with what was actually recorded.
+
+- series come straight from the memory-mapped demand tensor, so no feature
+  table is rebuilt; every (station, origin) pair is one row of a
+  FeatureState and all rows of a batch advance through the horizon together
+  (one predict call per step)
+- origins are split into contiguous folds that run in a process pool; each
+  worker maps the tensor and the model artifacts once
+- workers return error sums, not errors, so results stay small for a full
+  year of a large fleet
+
+By default origins cover the hold-out period (the last 20% of hours, see
+features.time_split), so in-sample hours do not flatter the scores.
+
+Usage:
+    python -m ev_intelligence.backtest --horizon 24 --stride 24 --workers 4
+    python -m ev_intelligence.backtest --days 365 --output data/forecasts/backtest.csv
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from ev_intelligence.demand_tensor import open_tensor
+from ev_intelligence.feature_state import WINDOW, FeatureState
+from ev_intelligence.forecasting import recursive_forecast
+from ev_intelligence.model_registry import current_model_path, load_model
+from ev_intelligence.paths import DATA_PATH, METADATA_PATH
+from ev_intelligence.tables import check_output_path, write_table
+
+# (station, origin) rows advanced together through the horizon
+BATCH_ROWS = 4096
+
+# Per-process state, filled by _init_worker
+_worker = {}
+
+
+def _init_worker(model_path, data_path, metadata_path):
+    _worker["model"] = load_model(model_path, data_path)
+    _worker["tensor"] = open_tensor(data_path, metadata_path)
+
+
+def origin_hours(tensor, stride=24, test_fraction=0.2, days=None):
+    """
+    Flat hour indices (into the tensor) of the newest known reading at each
+    forecast origin, oldest first.
+
+    Input:
+    - days (int): replay the last `days` days instead of the hold-out period
+    """
+    last = int(tensor.last_index.max())
+
+    if days is not None:
+        first_target = last + 1 - days * 24
+    else:
+        # Same cutoff as features.time_split over the hours with features
+        first_target = WINDOW + int((last + 1 - WINDOW) * (1 - test_fraction))
+
+    start = max(first_target - 1, WINDOW - 1)
+    return np.arange(start, last, stride)
+
+
+def _empty_sums(n_stations, horizon):
+    sums = {}
+    for name, size in (("step", horizon), ("station", n_stations), ("hour", 24)):
+        for stat in ("abs", "sq", "n"):
+            sums[f"{name}_{stat}"] = np.zeros(size)
+    return sums
+
+
+def _accumulate(sums, errors, rows, hours):
+    """Add absolute/squared error sums per step, station and hour of day."""
+    valid = ~np.isnan(errors)
+    abs_error = np.where(valid, np.abs(errors), 0.0)
+    sq_error = np.where(valid, errors ** 2, 0.0)
+
+    sums["step_abs"] += abs_error.sum(axis=0)
+    sums["step_sq"] += sq_error.sum(axis=0)
+    sums["step_n"] += valid.sum(axis=0)
+
+    n_stations = len(sums["station_n"])
+    station = np.broadcast_to(rows[:, None], errors.shape)
+    for name, groups, size in (("station", station, n_stations), ("hour", hours % 24, 24)):
+        sums[f"{name}_abs"] += np.bincount(groups.ravel(), abs_error.ravel(), size)
+        sums[f"{name}_sq"] += np.bincount(groups.ravel(), sq_error.ravel(), size)
+        sums[f"{name}_n"] += np.bincount(groups.ravel(), valid.ravel(), size)
+
+
+def _run_fold(origins, horizon):
+    """Error sums for every station forecast from each origin of the fold."""
+    model = _worker["model"]
+    tensor = _worker["tensor"]
+
+    flat = tensor.values.reshape(len(tensor.stations), -1)
+    stations = np.array(tensor.stations)
+    first_hour = tensor.first_day.astype("datetime64[h]").astype(np.int64)
+
+    sums = _empty_sums(len(stations), horizon)
+
+    # Every station at every origin whose next hour was recorded
+    rows, ends = np.meshgrid(np.arange(len(stations)), origins, indexing="ij")
+    rows, ends = rows.ravel(), ends.ravel()
+    keep = ends < tensor.last_index[rows]
+    rows, ends = rows[keep], ends[keep]
+
+    for start in range(0, len(rows), BATCH_ROWS):
+        batch_rows = rows[start:start + BATCH_ROWS]
+        batch_ends = ends[start:start + BATCH_ROWS]
+
+        recent = flat[batch_rows[:, None], batch_ends[:, None] + np.arange(1 - WINDOW, 1)]
+        complete = ~np.isnan(recent).any(axis=1)
+        if not complete.any():
+            continue
+        batch_rows, batch_ends, recent = batch_rows[complete], batch_ends[complete], recent[complete]
+
+        targets = batch_ends[:, None] + np.arange(1, horizon + 1)
+        in_range = targets < flat.shape[1]
+        actual = np.full(targets.shape, np.nan)
+        actual[in_range] = flat[np.broadcast_to(batch_rows[:, None], targets.shape)[in_range], targets[in_range]]
+
+        state = FeatureState(
+            recent,
+            (first_hour + batch_ends).astype("datetime64[h]"),
+            stations[batch_rows],
+            model.feature_names_in_
+        )
+        forecasts = recursive_forecast(model, state, horizon)
+
+        _accumulate(sums, actual - forecasts, batch_rows, first_hour + targets)
+
+    return sums
+
+
+def _table(sums, name, keys, key_name):
+    n = sums[f"{name}_n"]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return pd.DataFrame({
+            key_name: keys,
+            "mae": sums[f"{name}_abs"] / n,
+            "rmse": np.sqrt(sums[f"{name}_sq"] / n),
+            "n": n.astype(np.int64)
+        })
+
+
+def backtest(
+    model_path=None,
+    data_path=DATA_PATH,
+    metadata_path=METADATA_PATH,
+    horizon=24,
+    stride=24,
+    test_fraction=0.2,
+    days=None,
+    workers=1,
+    folds=None
+):
+    """
+    Input:
+    - model_path (str): model file; defaults to the registry's current version
+    - horizon (int): hours forecast from each origin
+    - stride (int): hours between origins
+    - days (int): replay the last `days` days instead of the hold-out period
+    - workers (int): processes; 1 runs in the current process
+    - folds (int): contiguous origin blocks (default: 4 per worker)
+
+    Output:
+    - results (dict): overall, by_step, by_station and by_hour DataFrames
+      with MAE, RMSE and the number of scored forecasts
+    """
+    model_path = model_path or current_model_path()
+    tensor = open_tensor(data_path, metadata_path)
+
+    origins = origin_hours(tensor, stride, test_fraction, days)
+    n_folds = max(1, min(folds or workers * 4, len(origins)))
+    fold_origins = np.array_split(origins, n_folds)
+
+    if workers <= 1:
+        _init_worker(model_path, data_path, metadata_path)
+        parts = [_run_fold(fold, horizon) for fold in fold_origins]
+    else:
+        # Write the model sidecars once so workers only map them
+        load_model(model_path, data_path)
+
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(model_path, data_path, metadata_path)
+        ) as pool:
+            parts = list(pool.map(_run_fold, fold_origins, [horizon] * len(fold_origins)))
+
+    sums = {key: sum(part[key] for part in parts) for key in parts[0]}
+
+    by_station = _table(sums, "station", tensor.stations, "station_id")
+    total = {
+        "abs": sums["step_abs"].sum(),
+        "sq": sums["step_sq"].sum(),
+        "n": sums["step_n"].sum()
+    }
+
+    first_hour = tensor.first_day.astype("datetime64[h]")
+    return {
+        "overall": pd.DataFrame([{
+            "mae": total["abs"] / max(total["n"], 1),
+            "rmse": np.sqrt(total["sq"] / max(total["n"], 1)),
+            "n": int(total["n"]),
+            "origins": len(origins),
+            "first_origin": first_hour + int(origins[0]) if len(origins) else None,
+            "last_origin": first_hour + int(origins[-1]) if len(origins) else None
+        }]),
+        "by_step": _table(sums, "step", np.arange(1, horizon + 1), "hours_ahead"),
+        "by_station": by_station[by_station["n"] > 0].reset_index(drop=True),
+        "by_hour": _table(sums, "hour", np.arange(24), "hour")
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Walk-forward backtest of the recursive forecaster.")
+    parser.add_argument("--horizon", type=int, default=24, help="hours forecast from each origin")
+    parser.add_argument("--stride", type=int, default=24, help="hours between origins")
+    parser.add_argument("--days", type=int, default=None, help="replay the last N days (default: hold-out period)")
+    parser.add_argument("--test-fraction", type=float, default=0.2)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--output", default=None, help="long table of all breakdowns (.parquet or .csv)")
+    parser.add_argument("--model", default=None, help="model file (default: registry's current version)")
+    parser.add_argument("--data", default=DATA_PATH)
+    parser.add_argument("--metadata", default=METADATA_PATH)
+    args = parser.parse_args()
+
+    if args.output:
+        try:
+            check_output_path(args.output)
+        except ValueError as error:
+            parser.error(str(error))
+
+    start = time.perf_counter()
+    results = backtest(
+        args.model,
+        args.data,
+        args.metadata,
+        horizon=args.horizon,
+        stride=args.stride,
+        test_fraction=args.test_fraction,
+        days=args.days,
+        workers=args.workers
+    )
+    elapsed = time.perf_counter() - start
+
+    overall = results["overall"].iloc[0]
+    print(f"Backtest: {overall['origins']} origins ({overall['first_origin']} to {overall['last_origin']}), "
+          f"{overall['n']} scored forecast hours in {elapsed:.1f}s")
+    print(f"Overall MAE: {overall['mae']:.3f}  RMSE: {overall['rmse']:.3f}")
+    print(results["by_step"].to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+
+    if args.output:
+        table = pd.concat([
+            results[name].rename(columns={key: "key"}).assign(breakdown=name[3:], key=lambda t: t["key"].astype(str))
+            for name, key in (("by_step", "hours_ahead"), ("by_station", "station_id"), ("by_hour", "hour"))
+        ], ignore_index=True)[["breakdown", "key", "mae", "rmse", "n"]]
+        write_table(table, args.output)
+        print(f"Saved at: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
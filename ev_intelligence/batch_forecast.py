@@ -0,0 +1,175 @@
+"""
+Batch Fleet Forecast
+--------------------
+Headless forecasting for every station in station_metadata.csv. Stations are
+split into chunks and forecast in a process pool; each worker loads the model
+and feature table once and runs the batched recursive forecaster on its
+chunk. The result is one table with demand, confidence bounds, utilization
+and risk per station-hour.
+
+Usage:
+    python -m ev_intelligence.batch_forecast --horizon 24 --workers 4 \
+        --output data/forecasts/fleet_forecast.parquet
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from ev_intelligence.decision import decision_engine_batch
+from ev_intelligence.feature_state import FeatureState
+from ev_intelligence.feature_store import ensure_features, load_features
+from ev_intelligence.forecasting import recursive_forecast
+from ev_intelligence.model_registry import current_model_path, load_model
+from ev_intelligence.paths import DATA_DIR, DATA_PATH, METADATA_PATH
+from ev_intelligence.residuals import load_residual_stats, station_band
+from ev_intelligence.tables import check_output_path, write_table
+
+DEFAULT_OUTPUT = os.path.join(DATA_DIR, "forecasts", "fleet_forecast.parquet")
+
+# Per-process state, filled by _init_worker
+_worker = {}
+
+
+def _init_worker(model_path, data_path):
+    _worker["model"] = load_model(model_path, data_path)
+    _worker["features"] = load_features(data_path)
+    _worker["residual_stats"] = load_residual_stats(model_path)
+
+
+def _forecast_chunk(stations, capacities, horizon, growth_factor):
+    model = _worker["model"]
+    features = _worker["features"]
+    residual_stats = _worker["residual_stats"]
+
+    history = features[features["station_id"].isin(stations)]
+    state = FeatureState.from_history(history, model.feature_names_in_)
+
+    first_hour = state.hours + 1
+    forecasts = recursive_forecast(model, state, horizon, growth_factor=growth_factor)
+
+    station_ids = state.station_ids
+    capacity = pd.Series(capacities, index=stations).loc[station_ids].to_numpy(dtype=float)
+
+    hours = first_hour[:, None] + np.arange(horizon)
+    if residual_stats is not None:
+        band = np.vstack([
+            station_band(residual_stats, station, row_hours)
+            for station, row_hours in zip(station_ids, hours)
+        ])
+    else:
+        band = np.full(forecasts.shape, np.nan)
+
+    decisions = decision_engine_batch(forecasts, capacity[:, None])
+
+    return pd.DataFrame({
+        "station_id": np.repeat(station_ids, horizon),
+        "hour_ahead": np.tile(np.arange(1, horizon + 1), len(station_ids)),
+        "timestamp": hours.ravel().astype("datetime64[h]").astype("datetime64[ns]"),
+        "predicted_demand": forecasts.ravel(),
+        "lower_bound": (forecasts - band).ravel(),
+        "upper_bound": (forecasts + band).ravel(),
+        "capacity_kw": np.repeat(capacity, horizon),
+        "utilization_ratio": decisions["utilization_ratio"].to_numpy(),
+        "risk_level": decisions["risk_level"].array,
+        "action": decisions["action"].array
+    })
+
+
+def forecast_fleet(
+    metadata,
+    horizon=24,
+    growth_factor=0,
+    workers=1,
+    chunk_size=256,
+    model_path=None,
+    data_path=DATA_PATH
+):
+    """
+    Input:
+    - metadata (DataFrame): station_id and capacity_kw per station
+    - horizon (int): hours ahead
+    - growth_factor (float): expected demand growth in percent
+    - workers (int): processes; 1 runs in the current process
+    - model_path (str): model file; defaults to the registry's current version
+
+    Output:
+    - forecast (DataFrame): one row per station-hour
+    """
+    # Resolved once, so every worker forecasts with the same version
+    model_path = model_path or current_model_path()
+
+    stations = metadata["station_id"].to_numpy()
+    capacities = metadata["capacity_kw"].to_numpy()
+
+    chunks = [
+        (stations[i:i + chunk_size], capacities[i:i + chunk_size], horizon, growth_factor)
+        for i in range(0, len(stations), chunk_size)
+    ]
+
+    if workers <= 1:
+        _init_worker(model_path, data_path)
+        parts = [_forecast_chunk(*chunk) for chunk in chunks]
+    else:
+        # Write the model sidecars and the feature store once, so workers
+        # only read them instead of all building them at the same time
+        load_model(model_path, data_path)
+        ensure_features(data_path)
+
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(model_path, data_path)
+        ) as pool:
+            parts = list(pool.map(_forecast_chunk, *zip(*chunks)))
+
+    return pd.concat(parts, ignore_index=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Forecast every station and write a fleet-wide table.")
+    parser.add_argument("--horizon", type=int, default=24, help="hours ahead")
+    parser.add_argument("--growth", type=float, default=0, help="expected demand growth in percent")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=256, help="stations per task")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help=".parquet or .csv")
+    parser.add_argument("--model", default=None, help="model file (default: registry's current version)")
+    parser.add_argument("--data", default=DATA_PATH)
+    parser.add_argument("--metadata", default=METADATA_PATH)
+    args = parser.parse_args()
+
+    try:
+        check_output_path(args.output)
+    except ValueError as error:
+        parser.error(str(error))
+
+    metadata = pd.read_csv(args.metadata)
+
+    start = time.perf_counter()
+    forecast = forecast_fleet(
+        metadata,
+        horizon=args.horizon,
+        growth_factor=args.growth,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        model_path=args.model,
+        data_path=args.data
+    )
+    elapsed = time.perf_counter() - start
+
+    write_table(forecast, args.output)
+
+    n_stations = forecast["station_id"].nunique()
+    missing = len(metadata) - n_stations
+    print(f"Forecast {n_stations} stations x {args.horizon}h in {elapsed:.2f}s "
+          f"({n_stations * args.horizon / elapsed:,.0f} station-horizons/sec)")
+    if missing:
+        print(f"Skipped {missing} stations with less than 24h of history")
+    print(f"Saved at: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
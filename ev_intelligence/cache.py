@@ -0,0 +1,296 @@
+"""
+Process-wide Data & Model Cache
+-------------------------------
+Streamlit re-executes a page on every widget interaction and for every
+session, but imported modules live for the whole server process. Loaders
+here keep the dataset, station metadata, feature table and model in memory
+once per process.
+
+An entry is revalidated on every access with os.stat: if mtime and size are
+unchanged it is a hit; otherwise the content hash decides whether the file
+really changed (touching a file does not force a reload).
+
+Cached objects are shared across sessions and must be treated as read-only.
+
+Each entry has its own lock, so a slow load (a backtest, a fleet forecast)
+only blocks sessions waiting for that same entry. Loaders that pull in
+heavy modules (scikit-learn, the backtest) import them inside the getter,
+so a page pays only for what it renders.
+"""
+import os
+import threading
+
+import pandas as pd
+
+from ev_intelligence.demand_tensor import open_tensor
+from ev_intelligence.feature_store import load_features, source_fingerprint
+from ev_intelligence.history_store import ensure_store, load_history_store
+from ev_intelligence.ingestion import read_history, read_station_ids
+from ev_intelligence.forecast_cache import forecast_cache
+from ev_intelligence.model_registry import REGISTRY_DIR, load_model, read_metadata
+from ev_intelligence.paths import DATA_PATH, METADATA_PATH, MODEL_PATH, RISK_SNAPSHOT_PATH
+from ev_intelligence.online_stats import load_online_stats
+from ev_intelligence.rollups import load_rollups
+from ev_intelligence.tables import read_table
+
+# Guards the dictionaries only; loads run under the entry's own lock
+_lock = threading.Lock()
+_key_locks = {}
+_entries = {}
+_counters = {}
+
+
+def _signature(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _count(key, outcome):
+    with _lock:
+        counts = _counters.setdefault(key, {"hits": 0, "misses": 0})
+        counts[outcome] += 1
+
+
+def _key_lock(key):
+    with _lock:
+        return _key_locks.setdefault(key, threading.RLock())
+
+
+def cached_load(path, loader, name=None, depends_on=None):
+    """
+    Return loader(path), reusing the value loaded earlier in this process
+    while the file content is unchanged. With depends_on (another file the
+    value is derived from, e.g. the dataset) the entry is also reloaded in
+    place when that file's content changes, so there is one entry per key
+    rather than one per data version.
+    """
+    path = os.path.abspath(path)
+    key = (name or loader.__name__, path)
+
+    with _key_lock(key):
+        signature = _signature(path)
+        dependency = None if depends_on is None else fingerprint(depends_on)
+        with _lock:
+            entry = _entries.get(key)
+
+        if entry is not None and entry["dependency"] != dependency:
+            entry = None
+
+        if entry is not None and entry["signature"] == signature:
+            _count(key, "hits")
+            return entry["value"]
+
+        digest = source_fingerprint(path)
+
+        if entry is not None and entry["digest"] == digest:
+            entry["signature"] = signature
+            _count(key, "hits")
+            return entry["value"]
+
+        _count(key, "misses")
+        value = loader(path)
+        with _lock:
+            _entries[key] = {"signature": signature, "digest": digest, "dependency": dependency, "value": value}
+        return value
+
+
+def fingerprint(path):
+    """Content hash of a cached file (computed at load time, not per call)."""
+    path = os.path.abspath(path)
+
+    with _lock:
+        entries = [entry for (_, entry_path), entry in _entries.items() if entry_path == path]
+
+    for entry in entries:
+        if entry["signature"] == _signature(path):
+            return entry["digest"]
+
+    return source_fingerprint(path)
+
+
+def get_history(path=DATA_PATH):
+    return cached_load(path, read_history, name="history")
+
+
+def _read_station_history(path, station):
+    ensure_store(path)
+    history = load_history_store(["datetime", "hour", "energy_kwh"], stations=[station])
+    history.insert(0, "date", history["datetime"].dt.floor("D"))
+    return history
+
+
+def get_station_history(station, path=DATA_PATH):
+    """
+    One station's history, read from its partitions in the columnar store;
+    only the stations actually viewed are kept in memory.
+    """
+    return cached_load(
+        path,
+        lambda p: _read_station_history(p, station),
+        name=f"history:{station}"
+    )
+
+
+def get_station_ids(path=DATA_PATH):
+    return cached_load(path, read_station_ids, name="station_ids")
+
+
+def get_metadata(path=METADATA_PATH):
+    return cached_load(path, pd.read_csv, name="metadata")
+
+
+def get_spatial_index(path=METADATA_PATH):
+    """Grid index over station coordinates, in metadata row order."""
+    from ev_intelligence.spatial import GridIndex
+
+    return cached_load(path, lambda p: GridIndex.from_metadata(get_metadata(p)), name="spatial_index")
+
+
+def get_features(path=DATA_PATH):
+    return cached_load(path, load_features, name="features")
+
+
+def get_demand_tensor(path=DATA_PATH, metadata_path=METADATA_PATH):
+    """Memory-mapped [station, day, hour] demand tensor."""
+    return cached_load(path, lambda p: open_tensor(p, metadata_path), name="demand_tensor")
+
+
+def get_rollups(path=DATA_PATH, metadata_path=METADATA_PATH):
+    """Per-station daily / hourly / weekday / histogram aggregates."""
+    return cached_load(path, lambda p: load_rollups(p, metadata_path), name="rollups")
+
+
+def get_online_stats(path=DATA_PATH, metadata_path=METADATA_PATH):
+    """Streaming per-station statistics (mean, variance, peak, quantiles)."""
+    return cached_load(path, lambda p: load_online_stats(p, metadata_path), name="online_stats")
+
+
+def get_risk_snapshot(path=RISK_SNAPSHOT_PATH):
+    """Latest risk snapshot written by the live service, or None."""
+    if not os.path.exists(path):
+        return None
+    return cached_load(path, read_table, name="risk_snapshot")
+
+
+def _drop_other_versions(path):
+    """Forget entries and forecasts of registry versions other than path's."""
+    registry = os.path.abspath(REGISTRY_DIR) + os.sep
+    version_dir = os.path.dirname(os.path.abspath(path)) + os.sep
+
+    with _lock:
+        stale = [
+            key for key in _entries
+            if key[1].startswith(registry) and not key[1].startswith(version_dir)
+        ]
+        for key in stale:
+            del _entries[key]
+
+    return len(stale)
+
+
+def get_model(path=MODEL_PATH, data_path=DATA_PATH):
+    """
+    ModelHandle: metadata from the JSON sidecar, forest memory-mapped and the
+    estimator unpickled only when a prediction needs it.
+
+    Loading a registry version releases the previously served one, together
+    with the forecasts it produced.
+    """
+    model = cached_load(path, lambda p: load_model(p, data_path), name="model")
+
+    if _drop_other_versions(path):
+        forecast_cache.retain(model.version)
+
+    return model
+
+
+def get_model_metadata(path=MODEL_PATH, data_path=DATA_PATH):
+    """Sidecar metadata only (feature names, importances, metrics)."""
+    return cached_load(
+        path,
+        lambda p: read_metadata(p) or get_model(p, data_path).metadata,
+        name="model_metadata"
+    )
+
+
+def get_residual_stats(model_path=MODEL_PATH, data_path=DATA_PATH):
+    """
+    Residual statistics stored next to the model. Older artifacts without a
+    sidecar get one computed and written on first use.
+    """
+    from ev_intelligence.residuals import compute_residual_stats, load_residual_stats, save_residual_stats
+
+    def load(path):
+        stats = load_residual_stats(path)
+        if stats is None:
+            stats = compute_residual_stats(get_model(path), get_features(data_path))
+            save_residual_stats(stats, path)
+        return stats
+
+    return cached_load(model_path, load, name="residual_stats")
+
+
+def get_backtest(model_path=MODEL_PATH, data_path=DATA_PATH, metadata_path=METADATA_PATH, horizon=24, stride=24):
+    """Walk-forward backtest over the hold-out period, per model and data version."""
+    from ev_intelligence.backtest import backtest
+
+    return cached_load(
+        model_path,
+        lambda p: backtest(p, data_path, metadata_path, horizon=horizon, stride=stride),
+        name=f"backtest:{horizon}:{stride}",
+        depends_on=data_path
+    )
+
+
+def get_fleet_forecast(model_path=MODEL_PATH, data_path=DATA_PATH, metadata_path=METADATA_PATH, horizon=24, growth_factor=0):
+    """
+    Forecast of every station over the horizon, per model, data version and
+    growth scenario (percent, compounded through the recursion as on the
+    Forecast Intelligence page).
+
+    Output:
+    - dict: station_id (array) and forecast (n_stations x horizon)
+    """
+    from ev_intelligence.feature_state import FeatureState
+    from ev_intelligence.forecasting import recursive_forecast
+
+    def load(path):
+        model = get_model(path, data_path)
+        state = FeatureState.from_tensor(get_demand_tensor(data_path, metadata_path), model.feature_names_in_)
+        return {
+            "station_id": state.station_ids,
+            "forecast": recursive_forecast(model, state, horizon, growth_factor=growth_factor)
+        }
+
+    return cached_load(model_path, load, name=f"fleet_forecast:{horizon}:{growth_factor}", depends_on=data_path)
+
+
+def get_redistribution_planner(path=METADATA_PATH):
+    """Neighbour index over station coordinates for load redistribution."""
+    from ev_intelligence.redistribution import RedistributionPlanner
+
+    return cached_load(
+        path,
+        lambda p: RedistributionPlanner.from_metadata(get_metadata(p)),
+        name="redistribution_planner"
+    )
+
+
+def cache_stats():
+    """
+    Output:
+    - stats (DataFrame): hits and misses per cached entry
+    """
+    with _lock:
+        rows = [
+            {"entry": name, "path": path, **counts}
+            for (name, path), counts in _counters.items()
+        ]
+
+    return pd.DataFrame(rows, columns=["entry", "path", "hits", "misses"])
+
+
+def clear_cache():
+    with _lock:
+        _entries.clear()
+        _counters.clear()
@@ -0,0 +1,29 @@
+"""
+Access to the Decision Intelligence Engine in decision_engine.py/, whose
+folder name is not an importable package.
+"""
+import importlib.util
+import sys
+
+from ev_intelligence.paths import DECISION_ENGINE_PATH
+
+
+def _load_engine():
+    module = sys.modules.get("decision_engine")
+    if module is None:
+        spec = importlib.util.spec_from_file_location("decision_engine", DECISION_ENGINE_PATH)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules["decision_engine"] = module
+        spec.loader.exec_module(module)
+    return module
+
+
+_engine = _load_engine()
+
+decision_engine = _engine.decision_engine
+decision_engine_batch = _engine.decision_engine_batch
+risk_codes = _engine.risk_codes
+
+MEDIUM_RISK_THRESHOLD = _engine.MEDIUM_RISK_THRESHOLD
+HIGH_RISK_THRESHOLD = _engine.HIGH_RISK_THRESHOLD
+RISK_LEVELS = _engine.RISK_LEVELS
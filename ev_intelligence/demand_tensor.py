@@ -0,0 +1,145 @@
+"""
+Station x Day x Hour Demand Tensor
+----------------------------------
+Dense float32 array indexed as [station, day, hour] (NaN where no reading),
+stored as a .npy under data/cache/ and memory-mapped on open. Station rows
+follow station_metadata.csv (history-only stations are appended), so a
+station's history, its hour x date heatmap or its last 24 hours are plain
+slices of the mapped file instead of a boolean mask over the whole fleet.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from numpy.lib.format import open_memmap
+
+from ev_intelligence.atomic import atomic_path, write_json
+from ev_intelligence.feature_store import source_fingerprint
+from ev_intelligence.history_store import STORE_DIR, ensure_store, load_history_store
+from ev_intelligence.paths import CACHE_DIR, DATA_PATH, METADATA_PATH
+
+
+class DemandTensor:
+
+    def __init__(self, values, stations, first_day, last_index):
+        """
+        Input:
+        - values (ndarray): (n_stations x n_days x 24) demand, usually a memmap
+        - stations (list): station id of each row
+        - first_day (datetime64[D]): date of day index 0
+        - last_index (array): flat hour index of each station's newest reading
+        """
+        self.values = values
+        self.stations = list(stations)
+        self.index = {station: i for i, station in enumerate(self.stations)}
+        self.first_day = np.datetime64(first_day, "D")
+        self.last_index = np.asarray(last_index, dtype=np.int64)
+
+    @property
+    def dates(self):
+        return self.first_day + np.arange(self.values.shape[1])
+
+    def station(self, station_id):
+        """(n_days x 24) view of one station."""
+        return self.values[self.index[station_id]]
+
+    def heatmap(self, station_id):
+        """(24 x n_days) hour x date view of one station."""
+        return self.values[self.index[station_id]].T
+
+    def last_hours(self, station_id, n=24):
+        """View of the station's n most recent hourly readings, oldest first."""
+        i = self.index[station_id]
+        end = self.last_index[i] + 1
+        return self.values[i].reshape(-1)[max(end - n, 0):end]
+
+    def recent(self, stations=None, n=24):
+        """
+        Output:
+        - stations (list): requested stations that have n readings
+        - values (ndarray): (k x n) most recent readings, oldest first
+        - last_timestamp (ndarray): datetime64[h] of each station's newest reading
+        """
+        if stations is None:
+            stations = self.stations
+
+        rows = np.array([self.index[s] for s in stations if s in self.index], dtype=np.int64)
+        ends = self.last_index[rows]
+        keep = ends >= n - 1
+        rows, ends = rows[keep], ends[keep]
+
+        flat = self.values.reshape(len(self.stations), -1)
+        values = flat[rows[:, None], ends[:, None] - np.arange(n - 1, -1, -1)]
+
+        last_timestamp = self.first_day.astype("datetime64[h]") + ends.astype("timedelta64[h]")
+        return [self.stations[i] for i in rows], values, last_timestamp
+
+
+def tensor_paths(data_path=DATA_PATH, metadata_path=METADATA_PATH, cache_dir=CACHE_DIR):
+    key = f"{source_fingerprint(data_path)}_{source_fingerprint(metadata_path)[:8]}"
+    base = os.path.join(cache_dir, f"demand_{key}")
+    return base + ".npy", base + ".json"
+
+
+def build_tensor(data_path=DATA_PATH, metadata_path=METADATA_PATH, cache_dir=CACHE_DIR, store_dir=STORE_DIR):
+    """Fill the tensor partition by partition from the columnar history store."""
+    manifest = ensure_store(data_path, store_dir)
+
+    stations = list(pd.read_csv(metadata_path, usecols=["station_id"])["station_id"])
+    stations += [s for s in manifest["stations"] if s not in set(stations)]
+    index = {station: i for i, station in enumerate(stations)}
+
+    first_day = min(np.datetime64(p["start"], "D") for p in manifest["partitions"])
+    last_day = max(np.datetime64(p["end"], "D") for p in manifest["partitions"])
+    n_days = int((last_day - first_day).astype(int)) + 1
+
+    values_path, meta_path = tensor_paths(data_path, metadata_path, cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    last_index = np.full(len(stations), -1, dtype=np.int64)
+    origin = first_day.astype("datetime64[h]")
+
+    # Concurrent builders each fill their own file; both results are identical
+    with atomic_path(values_path, ".npy") as tmp_path:
+        values = open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=(len(stations), n_days, 24))
+        values[:] = np.nan
+        flat = values.reshape(len(stations), -1)
+
+        for partition in manifest["partitions"]:
+            part = load_history_store(["datetime", "energy_kwh"], root=store_dir, partitions=[partition])
+            i = index[partition["station_id"]]
+            hours = (part["datetime"].to_numpy().astype("datetime64[h]") - origin).astype(np.int64)
+
+            flat[i, hours] = part["energy_kwh"].to_numpy()
+            last_index[i] = max(last_index[i], hours.max())
+
+        values.flush()
+        del values, flat
+
+    # Written last: open_tensor treats the tensor as present once both exist
+    write_json(meta_path, {
+        "stations": stations,
+        "first_day": str(first_day),
+        "last_index": last_index.tolist()
+    })
+
+    return open_tensor(data_path, metadata_path, cache_dir)
+
+
+def open_tensor(data_path=DATA_PATH, metadata_path=METADATA_PATH, cache_dir=CACHE_DIR):
+    """Memory-mapped tensor for the current data version, built if missing."""
+    values_path, meta_path = tensor_paths(data_path, metadata_path, cache_dir)
+
+    if not (os.path.exists(values_path) and os.path.exists(meta_path)):
+        return build_tensor(data_path, metadata_path, cache_dir)
+
+    with open(meta_path) as f:
+        meta = json.load(f)
+
+    return DemandTensor(
+        np.load(values_path, mmap_mode="r"),
+        meta["stations"],
+        meta["first_day"],
+        meta["last_index"]
+    )
@@ -0,0 +1,295 @@
+"""
+Flattened Forest Inference
+--------------------------
+scikit-learn's RandomForestRegressor.predict validates input and dispatches
+one job per tree on every call, which dominates the small batches of the
+recursive forecast loop (one call per horizon step). This module flattens a
+fitted forest into contiguous node arrays and evaluates all trees for all
+rows with a handful of NumPy gathers per tree level.
+
+Node layout (every tree concatenated, node ids global):
+- feature     split feature of each node (0 for leaves)
+- threshold   split threshold; leaves hold -inf so they always "go right"
+- right       right child; leaves point to themselves
+- value       node prediction
+- roots       first node of each tree
+
+scikit-learn stores trees depth-first, so the left child of a split is
+always the next node and needs no array.
+
+Predictions are bit-for-bit equal to model.predict as evaluated on a single
+worker: rows are compared as float32 against float64 thresholds, and tree
+outputs are summed in estimator order before dividing by the tree count.
+Inputs must not contain NaN.
+
+Usage:
+    python -m ev_intelligence.fast_forest export --model models/ev_demand_model.pkl
+    python -m ev_intelligence.fast_forest bench --rows 1 10 100 1000
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+import weakref
+
+import numpy as np
+
+from ev_intelligence.atomic import unique_directory
+from ev_intelligence.paths import MODEL_PATH
+
+NODE_ARRAYS = ["feature", "threshold", "right", "value", "roots"]
+ROW_CHUNK = 256
+
+# Above this many rows scikit-learn's compiled per-tree loop is faster
+FLAT_MAX_ROWS = 512
+
+
+class FlatForest:
+
+    def __init__(self, feature, threshold, right, value, roots, max_depth, feature_names=None):
+        self.feature = np.asarray(feature, dtype=np.intp)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.right = np.asarray(right, dtype=np.intp)
+        self.value = np.asarray(value, dtype=np.float64)
+        self.roots = np.asarray(roots, dtype=np.intp)
+        self.max_depth = int(max_depth)
+        self.feature_names_in_ = None if feature_names is None else np.asarray(feature_names, dtype=object)
+
+        # Traversal tables: thresholds rounded down to float32, so comparing
+        # float32 inputs gives the same branch as the float64 threshold, and
+        # both children of node n at children[2n] (left) / children[2n + 1]
+        leaf = self.threshold == -np.inf
+        self._threshold32 = self.threshold.astype(np.float32)
+        above = self._threshold32.astype(np.float64) > self.threshold
+        self._threshold32[above] = np.nextafter(self._threshold32[above], np.float32(-np.inf))
+
+        self._children = np.empty(2 * len(self.feature), dtype=np.intp)
+        self._children[0::2] = np.where(leaf, np.arange(len(self.feature)), np.arange(len(self.feature)) + 1)
+        self._children[1::2] = self.right
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @classmethod
+    def from_model(cls, model):
+        """Flatten a fitted single-output RandomForestRegressor (or any forest of regression trees)."""
+        if getattr(model, "n_outputs_", 1) != 1:
+            raise ValueError("Only single-output forests can be flattened")
+
+        features, thresholds, rights, values, roots = [], [], [], [], []
+        offset = 0
+        max_depth = 0
+
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            leaf = tree.children_left == -1
+            local = np.arange(n_nodes)
+
+            # Depth-first layout: the left child is always the next node
+            if not np.array_equal(tree.children_left[~leaf], local[~leaf] + 1):
+                raise ValueError("Unexpected tree layout: left child is not the next node")
+
+            features.append(np.where(leaf, 0, tree.feature))
+            thresholds.append(np.where(leaf, -np.inf, tree.threshold))
+            rights.append(np.where(leaf, local, tree.children_right) + offset)
+            values.append(tree.value[:, 0, 0])
+            roots.append(offset)
+
+            offset += n_nodes
+            max_depth = max(max_depth, tree.max_depth)
+
+        return cls(
+            np.concatenate(features),
+            np.concatenate(thresholds),
+            np.concatenate(rights),
+            np.concatenate(values),
+            roots,
+            max_depth,
+            getattr(model, "feature_names_in_", None)
+        )
+
+    def leaves(self, X):
+        """(n_rows x n_trees) leaf node reached by every row in every tree."""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_rows, n_features = X.shape
+
+        leaves = np.empty((n_rows, self.n_trees), dtype=np.intp)
+
+        # Row chunks keep the (rows x trees) working arrays cache-sized
+        for start in range(0, n_rows, ROW_CHUNK):
+            chunk = X[start:start + ROW_CHUNK]
+            flat_X = chunk.ravel()
+            row_base = (np.arange(len(chunk), dtype=np.intp) * n_features)[:, None]
+            nodes = np.broadcast_to(self.roots, (len(chunk), self.n_trees)).copy()
+
+            for _ in range(self.max_depth):
+                go_right = flat_X[row_base + self.feature[nodes]] > self._threshold32[nodes]
+                nodes = self._children[2 * nodes + go_right]
+
+            leaves[start:start + ROW_CHUNK] = nodes
+
+        return leaves
+
+    def predict_trees(self, X):
+        """(n_rows x n_trees) prediction of every tree."""
+        return self.value[self.leaves(X)]
+
+    def predict_paths(self, X, trees):
+        """Prediction of tree trees[i] for row i (one tree per row)."""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_rows, n_features = X.shape
+
+        flat_X = X.ravel()
+        row_base = np.arange(n_rows, dtype=np.intp) * n_features
+        nodes = self.roots[np.asarray(trees)]
+
+        for _ in range(self.max_depth):
+            go_right = flat_X[row_base + self.feature[nodes]] > self._threshold32[nodes]
+            nodes = self._children[2 * nodes + go_right]
+
+        return self.value[nodes]
+
+    def predict(self, X):
+        """Forest mean, summed tree by tree in estimator order like scikit-learn."""
+        per_tree = self.predict_trees(X)
+        return np.cumsum(per_tree, axis=1)[:, -1] / self.n_trees
+
+    # --------------------------------------------------
+    # Export
+    # --------------------------------------------------
+    def save(self, path):
+        """
+        Write one .npy per node array plus forest.json into a new directory
+        path.<suffix> and return it. A saved forest is never rewritten, so
+        readers mapping an older one are unaffected and concurrent writers
+        never share a directory; the model sidecar records which one is
+        current.
+        """
+        directory = unique_directory(path)
+
+        try:
+            for name in NODE_ARRAYS:
+                np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+
+            with open(os.path.join(directory, "forest.json"), "w") as f:
+                json.dump({
+                    "max_depth": self.max_depth,
+                    "feature_names": None if self.feature_names_in_ is None else list(self.feature_names_in_)
+                }, f)
+        except BaseException:
+            shutil.rmtree(directory, ignore_errors=True)
+            raise
+
+        return directory
+
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+        """Read a saved forest; mmap_mode="r" maps the node arrays instead of reading them."""
+        with open(os.path.join(path, "forest.json")) as f:
+            meta = json.load(f)
+
+        return cls(
+            *(np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode) for name in NODE_ARRAYS),
+            max_depth=meta["max_depth"],
+            feature_names=meta["feature_names"]
+        )
+
+
+def forest_path(model_path=MODEL_PATH):
+    """Prefix of the flattened forest directories stored next to the pickled model."""
+    return os.path.splitext(model_path)[0] + "_forest"
+
+
+# Flattened copy of each forest, built on first use and dropped with the model
+_flattened = weakref.WeakKeyDictionary()
+
+
+def flattened(model):
+    """FlatForest for model, or None if the model is not a forest of regression trees."""
+    # Registry handles carry their own memory-mapped forest
+    flat = getattr(model, "flat_forest", None)
+    if flat is not None:
+        return flat
+
+    try:
+        return _flattened[model]
+    except KeyError:
+        pass
+    except TypeError:
+        return None
+
+    estimators = getattr(model, "estimators_", None)
+    if not estimators or not all(hasattr(e, "tree_") for e in estimators) or not hasattr(model, "n_outputs_"):
+        flat = None
+    else:
+        try:
+            flat = FlatForest.from_model(model)
+        except ValueError:
+            flat = None
+
+    _flattened[model] = flat
+    return flat
+
+
+# --------------------------------------------------
+# CLI
+# --------------------------------------------------
+def benchmark(model, rows=(1, 10, 100, 1000), repeats=20, seed=0):
+    from ev_intelligence.forecasting import sklearn_predict
+
+    flat = FlatForest.from_model(model)
+    rng = np.random.default_rng(seed)
+    n_features = model.n_features_in_
+
+    results = []
+    for n in rows:
+        X = rng.normal(10, 8, (n, n_features))
+
+        timings = {}
+        for name, predict in [("sklearn", lambda X: sklearn_predict(model, X)), ("flat", flat.predict)]:
+            predict(X)
+            started = time.perf_counter()
+            for _ in range(repeats):
+                prediction = predict(X)
+            timings[name] = (time.perf_counter() - started) / repeats
+
+        results.append({
+            "rows": n,
+            "sklearn_ms": timings["sklearn"] * 1000,
+            "flat_ms": timings["flat"] * 1000,
+            "speedup": timings["sklearn"] / timings["flat"],
+            "identical": bool(np.array_equal(sklearn_predict(model, X), prediction))
+        })
+
+    return results
+
+
+def main():
+    import joblib
+
+    parser = argparse.ArgumentParser(description="Flatten and benchmark the random forest model.")
+    parser.add_argument("command", choices=["export", "bench"])
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--output", default=None, help="export: directory prefix (default: next to the model)")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    model = joblib.load(args.model)
+
+    if args.command == "export":
+        flat = FlatForest.from_model(model)
+        path = flat.save(args.output or forest_path(args.model))
+        print(f"Flattened {flat.n_trees} trees ({len(flat.value)} nodes, depth {flat.max_depth}) to {path}")
+        return
+
+    print(f"{'rows':>6} {'sklearn ms':>11} {'flat ms':>9} {'speedup':>8}  identical")
+    for r in benchmark(model, args.rows, args.repeats):
+        print(f"{r['rows']:>6} {r['sklearn_ms']:>11.3f} {r['flat_ms']:>9.3f} {r['speedup']:>7.1f}x  {r['identical']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Feature State for Recursive Forecasting
+---------------------------------------
+Keeps the last 24 hourly readings of every series in a ring buffer and
+derives all engineered features for the next hour in O(1) per step:
+
+- hour, day_of_week, is_weekend  from the advancing timestamp
+- lag_1                          newest value in the buffer
+- lag_24                         oldest value in the buffer
+- rolling_mean_3                 mean of the three newest values
+
+These match build_features row for row: every feature of an hour is
+derived from the readings before it.
+"""
+import numpy as np
+import pandas as pd
+
+WINDOW = 24
+
+
+class FeatureState:
+
+    def __init__(self, recent, last_timestamp, station_ids, feature_cols):
+        """
+        Input:
+        - recent (array): (n_series x 24) readings, oldest to newest
+        - last_timestamp (array): datetime64 of the newest reading per series
+        - station_ids (array): station of each series
+        - feature_cols (list): model feature order
+        """
+        self.feature_cols = list(feature_cols)
+        self.station_ids = np.asarray(station_ids)
+
+        self.buffer = np.array(recent, dtype=float, ndmin=2)
+        if self.buffer.shape[1] != WINDOW:
+            raise ValueError(f"FeatureState needs the last {WINDOW} readings per series")
+
+        # Slot holding the oldest reading, i.e. the next one to be overwritten
+        self.pos = 0
+        self.hours = (
+            np.asarray(last_timestamp, dtype="datetime64[h]").astype(np.int64)
+        )
+
+        self._col = {name: j for j, name in enumerate(self.feature_cols)}
+
+        self.X = np.zeros((len(self.buffer), len(self.feature_cols)))
+        for name, j in self._col.items():
+            if name.startswith("station_id_"):
+                self.X[:, j] = self.station_ids == name[len("station_id_"):]
+
+        self._refresh()
+
+    @classmethod
+    def from_history(cls, df, feature_cols):
+        """
+        Build the state from raw history (date, hour, station_id, energy_kwh).
+        Stations with fewer than 24 readings are skipped.
+        """
+        if "datetime" not in df.columns:
+            df = df.assign(
+                datetime=pd.to_datetime(df["date"]) + pd.to_timedelta(df["hour"], unit="h")
+            )
+
+        recent = (
+            df[["station_id", "datetime", "energy_kwh"]]
+            .sort_values(["station_id", "datetime"])
+            .groupby("station_id", sort=False, observed=True)
+            .tail(WINDOW)
+        )
+        counts = recent.groupby("station_id", sort=False, observed=True)["energy_kwh"].transform("size")
+        recent = recent[counts == WINDOW]
+
+        station_ids = recent["station_id"].to_numpy()[WINDOW - 1::WINDOW]
+        last_timestamp = recent["datetime"].to_numpy()[WINDOW - 1::WINDOW]
+        values = recent["energy_kwh"].to_numpy(dtype=float).reshape(-1, WINDOW)
+
+        return cls(values, last_timestamp, station_ids, feature_cols)
+
+    @classmethod
+    def from_tensor(cls, tensor, feature_cols, stations=None):
+        """
+        Build the state from the last 24 hours of a DemandTensor (default:
+        every station with a full window).
+        """
+        station_ids, values, last_timestamp = tensor.recent(stations, WINDOW)
+        return cls(values, last_timestamp, station_ids, feature_cols)
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def repeat(self, k):
+        """New state with every series repeated k times, consecutively."""
+        recent = np.roll(self.buffer, -self.pos, axis=1)
+        return FeatureState(
+            np.repeat(recent, k, axis=0),
+            np.repeat(self.hours, k).astype("datetime64[h]"),
+            np.repeat(self.station_ids, k),
+            self.feature_cols
+        )
+
+    def matrix(self):
+        """(n_series x n_features) feature matrix for the next hour."""
+        return self.X
+
+    def push(self, values):
+        """Record the reading (or forecast) for the next hour and advance."""
+        self.buffer[:, self.pos] = values
+        self.pos = (self.pos + 1) % WINDOW
+        self.hours += 1
+        self._refresh()
+
+    def _set(self, name, values):
+        j = self._col.get(name)
+        if j is not None:
+            self.X[:, j] = values
+
+    def _refresh(self):
+        target = self.hours + 1
+        day_of_week = (target // 24 + 3) % 7  # 1970-01-01 was a Thursday
+
+        newest = (self.pos - 1) % WINDOW
+        last_three = [(self.pos - k) % WINDOW for k in (1, 2, 3)]
+
+        self._set("hour", target % 24)
+        self._set("day_of_week", day_of_week)
+        self._set("is_weekend", day_of_week >= 5)
+        self._set("lag_1", self.buffer[:, newest])
+        self._set("lag_24", self.buffer[:, self.pos])
+        self._set("rolling_mean_3", self.buffer[:, last_three].mean(axis=1))
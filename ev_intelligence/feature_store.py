@@ -0,0 +1,86 @@
+"""
+Feature Store
+-------------
+Engineered features persisted as an uncompressed columnar .npz under
+data/cache/, keyed by a hash of the source CSV and the feature definitions'
+version. Pages load the stored columns instead of re-deriving lags and
+rolling means on every rerun; a new or edited source file simply produces
+a new key.
+"""
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+from ev_intelligence.atomic import save_npz
+from ev_intelligence.features import BASE_FEATURES, FEATURES_VERSION, build_features
+from ev_intelligence.ingestion import read_history
+from ev_intelligence.paths import CACHE_DIR, DATA_PATH
+
+STORE_COLUMNS = ["energy_kwh"] + BASE_FEATURES
+
+
+def source_fingerprint(path):
+    """Short SHA-1 of the file contents."""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def store_path(data_path=DATA_PATH, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, f"features_{source_fingerprint(data_path)}_v{FEATURES_VERSION}.npz")
+
+
+def save_features(features, path):
+    station_names, station_codes = np.unique(
+        features["station_id"].to_numpy(dtype=str), return_inverse=True
+    )
+
+    arrays = {
+        "station_names": station_names,
+        "station_codes": station_codes.astype(np.int32),
+        "datetime": features["datetime"].to_numpy(dtype="datetime64[ns]").astype(np.int64)
+    }
+    for col in STORE_COLUMNS:
+        arrays[col] = features[col].to_numpy(dtype=float)
+
+    save_npz(path, **arrays)
+
+
+def read_features(path):
+    with np.load(path, allow_pickle=False) as store:
+        features = pd.DataFrame({
+            "station_id": store["station_names"][store["station_codes"]],
+            "datetime": store["datetime"].astype("datetime64[ns]")
+        })
+        for col in STORE_COLUMNS:
+            features[col] = store[col]
+
+    features["hour"] = features["hour"].astype(int)
+    features["day_of_week"] = features["day_of_week"].astype(int)
+    features["is_weekend"] = features["is_weekend"].astype(int)
+    return features
+
+
+def ensure_features(data_path=DATA_PATH, cache_dir=CACHE_DIR):
+    """Build the stored features for the current source version if missing; returns the store path."""
+    path = store_path(data_path, cache_dir)
+
+    if not os.path.exists(path):
+        save_features(build_features(read_history(data_path)), path)
+
+    return path
+
+
+def load_features(data_path=DATA_PATH, cache_dir=CACHE_DIR):
+    """
+    Engineered features for every station, built once per source version.
+
+    Output:
+    - features (DataFrame): station_id, datetime, energy_kwh and
+      BASE_FEATURES, sorted by station and time
+    """
+    return read_features(ensure_features(data_path, cache_dir))
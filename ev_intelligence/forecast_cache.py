@@ -0,0 +1,104 @@
+"""
+Forecast Result Cache
+---------------------
+Bounded LRU cache with a time-to-live for recursive forecasts, keyed by
+(station, growth factor, model version, data version, kind). Only the longest
+horizon computed for a key is kept: a 72-hour forecast also answers any
+shorter horizon as a prefix. Values are indexed by hour ahead first, so
+quantile forecasts are stored as (horizon x n_quantiles).
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class ForecastCache:
+
+    def __init__(self, max_entries=512, ttl_seconds=3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(station, growth_factor, model_version, data_version, kind="point"):
+        return (station, float(growth_factor), model_version, data_version, kind)
+
+    def get(self, key, horizon):
+        """Cached forecast of at least `horizon` steps, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None and time.monotonic() - entry[0] > self.ttl_seconds:
+                del self._entries[key]
+                entry = None
+
+            if entry is None or len(entry[1]) < horizon:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1][:horizon]
+
+    def put(self, key, values):
+        values = np.array(values, dtype=float)
+        values.setflags(write=False)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and len(entry[1]) > len(values):
+                values = entry[1]
+
+            self._entries[key] = (time.monotonic(), values)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key, horizon, compute):
+        """
+        Return the first `horizon` steps for key, calling compute(horizon)
+        only on a miss.
+        """
+        values = self.get(key, horizon)
+
+        if values is None:
+            values = compute(horizon)
+            self.put(key, values)
+            values = values[:horizon]
+
+        return values
+
+    def retain(self, model_version):
+        """Drop entries computed by any other model version (after a swap)."""
+        with self._lock:
+            stale = [key for key in self._entries if key[2] != model_version]
+            for key in stale:
+                del self._entries[key]
+            self.evictions += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+
+# Shared by every session of the Streamlit process
+forecast_cache = ForecastCache()
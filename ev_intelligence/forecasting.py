@@ -0,0 +1,121 @@
+"""
+Recursive Forecasting Engine
+----------------------------
+Advances every station together: one model.predict call per horizon step on
+an (n_stations x n_features) matrix, instead of one call per station per hour.
+
+ensemble_forecast() runs one trajectory per tree of a forest: path m is
+always evaluated by tree m and its predictions are fed back as that path's
+lags, so the spread of the trajectories widens with the horizon as errors
+compound. Each step evaluates one tree per path, the same work as a single
+forest prediction per series. Tree spread alone only reflects model
+uncertainty; passing the stored residual statistics adds demand noise to
+every path.
+"""
+import warnings
+
+import numpy as np
+
+from ev_intelligence.fast_forest import FLAT_MAX_ROWS, flattened
+
+QUANTILES = np.array([0.1, 0.5, 0.9])
+
+
+def sklearn_predict(model, X):
+    """
+    model.predict on a plain NumPy matrix whose columns follow
+    model.feature_names_in_ (skips the per-call DataFrame validation).
+    """
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message="X does not have valid feature names")
+        return model.predict(X)
+
+
+def predict_matrix(model, X):
+    """
+    Predict on a plain NumPy matrix whose columns follow
+    model.feature_names_in_. Small batches of a random forest go through
+    the flattened evaluator (same predictions, far lower per-call overhead).
+    """
+    if len(X) <= FLAT_MAX_ROWS:
+        flat = flattened(model)
+        if flat is not None:
+            return flat.predict(X)
+    return sklearn_predict(model, X)
+
+
+def recursive_forecast(model, state, horizon, growth_factor=0):
+    """
+    Recursive multi-step forecast for many stations at once.
+
+    Input:
+    - model: fitted regressor
+    - state (FeatureState): rolling features of every series, advanced in place
+    - horizon (int): hours ahead
+    - growth_factor (float or array): expected demand growth in percent,
+      one value for all series or one per series
+
+    Output:
+    - forecasts (ndarray): (n_series x horizon) predicted demand
+    """
+    forecasts = np.empty((len(state), horizon))
+
+    for step in range(horizon):
+        pred = predict_matrix(model, state.matrix()) * (1 + growth_factor / 100)
+        forecasts[:, step] = pred
+        state.push(pred)
+
+    return forecasts
+
+
+def ensemble_forecast(model, state, horizon, growth_factor=0, quantiles=QUANTILES, residual_stats=None, seed=0):
+    """
+    Quantile trajectories from one recursive path per tree.
+
+    Input:
+    - model: fitted tree ensemble (or a registry handle of one)
+    - state (FeatureState): rolling features of every series (not advanced)
+    - horizon (int): hours ahead
+    - growth_factor (float or array): expected demand growth in percent
+    - quantiles (array): levels across the tree paths
+    - residual_stats (dict): if given, each path also draws noise with the
+      station/hour residual std, so the band covers demand noise as well as
+      model uncertainty
+    - seed (int): noise seed
+
+    Output:
+    - forecasts (ndarray): (n_series x len(quantiles) x horizon)
+    """
+    flat = flattened(model)
+    if flat is None:
+        raise ValueError("Ensemble forecasts need a forest of regression trees")
+
+    n_series, n_trees = len(state), flat.n_trees
+    paths = state.repeat(n_trees)
+    trees = np.tile(np.arange(n_trees), n_series)
+    growth = 1 + np.repeat(np.broadcast_to(growth_factor, n_series), n_trees) / 100
+
+    if residual_stats is not None:
+        rng = np.random.default_rng(seed)
+        index = {name: i for i, name in enumerate(residual_stats["station_names"])}
+        rows = np.array([index.get(station, -1) for station in paths.station_ids])
+        hourly_std = np.vstack([
+            residual_stats["hourly_std"],
+            np.full(24, float(residual_stats["overall_std"]))
+        ])
+        hourly_std = np.where(np.isnan(hourly_std), float(residual_stats["overall_std"]), hourly_std)
+
+    trajectories = np.empty((len(paths), horizon))
+
+    for step in range(horizon):
+        pred = flat.predict_paths(paths.matrix(), trees)
+        if residual_stats is not None:
+            noise = rng.standard_normal(len(pred)) * hourly_std[rows, (paths.hours + 1) % 24]
+            pred = np.maximum(pred + noise, 0)
+
+        pred = pred * growth
+        trajectories[:, step] = pred
+        paths.push(pred)
+
+    trajectories = trajectories.reshape(n_series, n_trees, horizon)
+    return np.moveaxis(np.quantile(trajectories, quantiles, axis=1), 0, 1)
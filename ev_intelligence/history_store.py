@@ -0,0 +1,380 @@
+"""
+Columnar History Store
+----------------------
+Charging history as one .npy file per column, partitioned by station and
+month:
+
+    data/store/
+        manifest.json
+        station=Station_1/month=2025-01/datetime.npy
+                                        hour.npy
+                                        energy_kwh.npy
+                                        day_of_week.npy
+                                        is_weekend.npy
+                                        month.npy
+                                        station_code.npy
+
+Derived fields (day_of_week, is_weekend, month, station code) are
+materialized once at build time. The loader prunes partitions by station
+and month from the manifest, reads only the requested columns and
+memory-maps each file, so a single-partition read is zero-copy.
+
+Readers never take a lock: every column file and the manifest are written
+to a new file and renamed into place, so a reader that mapped the previous
+version keeps it intact. Writers (rebuilds and appends) serialize on a lock
+file in the store root, and a rebuild overwrites partitions in place rather
+than deleting the store, because the live service appends to the CSV a
+moment before it re-tags the manifest and a reader seeing that brief
+mismatch must not pull the store away from everyone else.
+
+Usage:
+    python -m ev_intelligence.history_store [--source PATH] [--root DIR]
+"""
+import argparse
+import fcntl
+import json
+import os
+import shutil
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from ev_intelligence.atomic import save_npy, write_json
+from ev_intelligence.feature_store import source_fingerprint
+from ev_intelligence.ingestion import read_history, read_station_ids
+from ev_intelligence.paths import DATA_DIR, DATA_PATH
+
+STORE_DIR = os.path.join(DATA_DIR, "store")
+
+COLUMN_DTYPES = {
+    "datetime": "datetime64[s]",
+    "hour": np.int8,
+    "energy_kwh": np.float32,
+    "day_of_week": np.int8,
+    "is_weekend": np.int8,
+    "month": np.int8,
+    "station_code": np.int16
+}
+COLUMNS = list(COLUMN_DTYPES)
+
+
+def _partition_dir(root, station, month):
+    return os.path.join(root, f"station={station}", f"month={month}")
+
+
+@contextmanager
+def _writer_lock(root):
+    """Exclusive lock held by whichever process is changing the store."""
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, ".lock"), "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _derive(history, station_codes):
+    """Materialize every store column from a read_history frame."""
+    datetime = history["datetime"].to_numpy(dtype="datetime64[s]")
+    day_of_week = history["datetime"].dt.dayofweek.to_numpy()
+
+    return pd.DataFrame({
+        "station_id": history["station_id"].astype(str).to_numpy(),
+        "datetime": datetime,
+        "hour": history["hour"].to_numpy(),
+        "energy_kwh": history["energy_kwh"].to_numpy(),
+        "day_of_week": day_of_week,
+        "is_weekend": day_of_week >= 5,
+        "month": history["datetime"].dt.month.to_numpy(),
+        "station_code": history["station_id"].astype(str).map(station_codes).to_numpy()
+    })
+
+
+def _write_partitions(rows, root):
+    """Write (or overwrite) the partitions covered by rows; return their entries."""
+    rows = rows.sort_values(["station_id", "datetime"], kind="stable")
+    month_keys = rows["datetime"].to_numpy(dtype="datetime64[M]").astype(str)
+
+    entries = []
+    for (station, month), part in rows.groupby([rows["station_id"], month_keys], sort=False):
+        directory = _partition_dir(root, station, month)
+        os.makedirs(directory, exist_ok=True)
+
+        for col, dtype in COLUMN_DTYPES.items():
+            save_npy(os.path.join(directory, f"{col}.npy"), part[col].to_numpy(dtype=dtype))
+
+        entries.append({
+            "station_id": station,
+            "month": month,
+            "rows": len(part),
+            "start": str(part["datetime"].iloc[0]),
+            "end": str(part["datetime"].iloc[-1])
+        })
+
+    return entries
+
+
+def _write_manifest(root, manifest):
+    write_json(os.path.join(root, "manifest.json"), manifest, indent=1)
+
+
+def _remove_unlisted(root, manifest):
+    """Delete partition directories the manifest no longer lists."""
+    listed = {_partition_dir(root, p["station_id"], p["month"]) for p in manifest["partitions"]}
+
+    for station_dir in os.listdir(root):
+        station_path = os.path.join(root, station_dir)
+        if not (station_dir.startswith("station=") and os.path.isdir(station_path)):
+            continue
+        for month_dir in os.listdir(station_path):
+            if os.path.join(station_path, month_dir) not in listed:
+                shutil.rmtree(os.path.join(station_path, month_dir), ignore_errors=True)
+        if not os.listdir(station_path):
+            os.rmdir(station_path)
+
+
+def read_manifest(root=STORE_DIR):
+    path = os.path.join(root, "manifest.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def build_store(source=DATA_PATH, root=STORE_DIR, stations_per_pass=None):
+    """
+    Build the store from the history CSV. With stations_per_pass, the CSV is
+    streamed once per group of stations to bound memory on large fleets.
+    Partitions are overwritten in place; only station-months missing from
+    the new manifest are deleted, after it has been written.
+    """
+    with _writer_lock(root):
+        return _build_store(source, root, stations_per_pass)
+
+
+def _build_store(source, root, stations_per_pass):
+    # Fingerprinted first: rows appended while the build reads the CSV are
+    # picked up by the next check instead of being tagged as included
+    fingerprint = source_fingerprint(source)
+    stations = read_station_ids(source)
+    station_codes = {station: code for code, station in enumerate(stations)}
+
+    step = stations_per_pass or len(stations) or 1
+    partitions = []
+
+    for i in range(0, len(stations), step):
+        history = read_history(source, stations=stations[i:i + step] if stations_per_pass else None)
+        partitions.extend(_write_partitions(_derive(history, station_codes), root))
+
+    manifest = {
+        "source_fingerprint": fingerprint,
+        "stations": stations,
+        "columns": COLUMNS,
+        "partitions": partitions
+    }
+    _write_manifest(root, manifest)
+    _remove_unlisted(root, manifest)
+    return manifest
+
+
+def ensure_store(source=DATA_PATH, root=STORE_DIR):
+    """Manifest of an up-to-date store, rebuilding it if the source changed."""
+    manifest = read_manifest(root)
+    if manifest is not None and manifest["source_fingerprint"] == source_fingerprint(source):
+        return manifest
+
+    with _writer_lock(root):
+        # Another writer (usually the live service finishing an append) may
+        # have brought the store up to date while this one waited
+        manifest = read_manifest(root)
+        if manifest is None or manifest["source_fingerprint"] != source_fingerprint(source):
+            manifest = _build_store(source, root, None)
+    return manifest
+
+
+def append_to_store(readings, source=DATA_PATH, root=STORE_DIR):
+    """
+    Add readings (date, hour, station_id, energy_kwh) to the store, rewriting
+    only the station-months they touch. The caller is expected to have
+    appended the same readings to the source CSV; the manifest is re-tagged
+    with its new fingerprint.
+    """
+    with _writer_lock(root):
+        return _append_to_store(readings, source, root)
+
+
+def _append_to_store(readings, source, root):
+    manifest = read_manifest(root)
+    if manifest is None:
+        # Nothing to append to; the source already holds the readings
+        return _build_store(source, root, None)
+
+    readings = readings.assign(
+        station_id=readings["station_id"].astype(str),
+        datetime=pd.to_datetime(readings["date"]) + pd.to_timedelta(readings["hour"].astype(int), unit="h")
+    )
+
+    touched = readings["datetime"].to_numpy(dtype="datetime64[M]").astype(str)
+    keys = set(zip(readings["station_id"], touched))
+
+    # Codes are positions in the sorted station list, as in a rebuild; a new
+    # station shifts the codes after it, so untouched partitions of those
+    # stations get their station_code column rewritten
+    stations = sorted(set(manifest["stations"]) | set(readings["station_id"]))
+    station_codes = {station: code for code, station in enumerate(stations)}
+    previous_codes = {station: code for code, station in enumerate(manifest["stations"])}
+
+    for p in manifest["partitions"]:
+        station = p["station_id"]
+        if previous_codes[station] != station_codes[station] and (station, p["month"]) not in keys:
+            save_npy(
+                os.path.join(_partition_dir(root, station, p["month"]), "station_code.npy"),
+                np.full(p["rows"], station_codes[station], dtype=COLUMN_DTYPES["station_code"])
+            )
+    manifest["stations"] = stations
+
+    existing = load_history_store(
+        root=root,
+        partitions=[p for p in manifest["partitions"] if (p["station_id"], p["month"]) in keys]
+    )
+    if len(existing):
+        existing = existing[["station_id", "datetime", "hour", "energy_kwh"]]
+
+    combined = pd.concat([
+        existing,
+        readings[["station_id", "datetime", "hour", "energy_kwh"]]
+    ], ignore_index=True)
+    combined = combined.drop_duplicates(["station_id", "datetime"], keep="last")
+    combined["station_id"] = combined["station_id"].astype("category")
+    combined["hour"] = combined["hour"].astype(np.int8)
+    combined["energy_kwh"] = combined["energy_kwh"].astype(np.float32)
+
+    written = _write_partitions(_derive(combined, station_codes), root)
+
+    manifest["partitions"] = [
+        p for p in manifest["partitions"] if (p["station_id"], p["month"]) not in keys
+    ] + written
+    manifest["source_fingerprint"] = source_fingerprint(source)
+    _write_manifest(root, manifest)
+    return manifest
+
+
+def select_partitions(manifest, stations=None, start=None, end=None):
+    """Manifest entries overlapping the station set and [start, end]."""
+    selected = manifest["partitions"]
+
+    if stations is not None:
+        stations = set(stations)
+        selected = [p for p in selected if p["station_id"] in stations]
+    if start is not None:
+        start = pd.Timestamp(start)
+        selected = [p for p in selected if pd.Timestamp(p["end"]) >= start]
+    if end is not None:
+        end = pd.Timestamp(end)
+        selected = [p for p in selected if pd.Timestamp(p["start"]) <= end]
+
+    return selected
+
+
+def load_history_store(
+    columns=None,
+    stations=None,
+    start=None,
+    end=None,
+    root=STORE_DIR,
+    partitions=None
+):
+    """
+    Input:
+    - columns (list): store columns to read (default: all)
+    - stations (list): station ids to read (default: all)
+    - start, end: keep start <= datetime <= end
+
+    Output:
+    - history (DataFrame): station_id (category) plus the requested columns
+    """
+    columns = list(columns or COLUMNS)
+    read_columns = list(columns)
+    if (start is not None or end is not None) and "datetime" not in read_columns:
+        read_columns.append("datetime")
+
+    if partitions is None:
+        manifest = read_manifest(root)
+        if manifest is None:
+            raise FileNotFoundError(f"No history store at {root}, run build_store() first")
+        partitions = select_partitions(manifest, stations, start, end)
+
+    arrays = {col: [] for col in read_columns}
+    station_ids = []
+
+    # Several partitions are concatenated anyway; mapping each of them would
+    # hold one file descriptor per partition column until then
+    mmap_mode = "r" if len(partitions) == 1 else None
+
+    for partition in partitions:
+        directory = _partition_dir(root, partition["station_id"], partition["month"])
+        for col in read_columns:
+            arrays[col].append(np.load(os.path.join(directory, f"{col}.npy"), mmap_mode=mmap_mode))
+        # Sized from the files: an append may have replaced them since the manifest was read
+        station_ids.append(np.full(len(arrays[read_columns[0]][-1]), partition["station_id"], dtype=object))
+
+    data = {
+        "station_id": pd.Categorical(np.concatenate(station_ids) if station_ids else [])
+    }
+    for col in read_columns:
+        if len(arrays[col]) == 1:
+            data[col] = arrays[col][0]
+        elif arrays[col]:
+            data[col] = np.concatenate(arrays[col])
+        else:
+            data[col] = np.empty(0, dtype=COLUMN_DTYPES[col])
+
+    history = pd.DataFrame(data, copy=False)
+
+    if start is not None:
+        history = history[history["datetime"] >= pd.Timestamp(start)]
+    if end is not None:
+        history = history[history["datetime"] <= pd.Timestamp(end)]
+
+    return history[["station_id"] + columns].reset_index(drop=True)
+
+
+def load_preprocessed(root=STORE_DIR, source=DATA_PATH):
+    """
+    Same layout as ev_charging_data_preprocessed.csv (station_id as its
+    integer code), served from the store.
+    """
+    ensure_store(source, root)
+    history = load_history_store(
+        ["datetime", "hour", "station_code", "energy_kwh", "day_of_week", "is_weekend", "month"],
+        root=root
+    )
+
+    return pd.DataFrame({
+        "date": history["datetime"].dt.floor("D"),
+        "hour": history["hour"],
+        "station_id": history["station_code"],
+        "energy_kwh": history["energy_kwh"],
+        "day_of_week": history["day_of_week"],
+        "is_weekend": history["is_weekend"],
+        "month": history["month"]
+    }).sort_values(["date", "hour", "station_id"], ignore_index=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the columnar history store.")
+    parser.add_argument("--source", default=DATA_PATH)
+    parser.add_argument("--root", default=STORE_DIR)
+    parser.add_argument("--stations-per-pass", type=int, default=None)
+    args = parser.parse_args()
+
+    manifest = build_store(args.source, args.root, args.stations_per_pass)
+    rows = sum(p["rows"] for p in manifest["partitions"])
+    print(f"History store built at: {args.root}")
+    print(f"{rows:,} rows in {len(manifest['partitions'])} partitions")
+
+
+if __name__ == "__main__":
+    main()
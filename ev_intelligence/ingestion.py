@@ -0,0 +1,109 @@
+"""
+History Ingestion
+-----------------
+Chunked reader for ev_charging_data.csv with compact dtypes:
+
+- station_id   category
+- hour         int8
+- energy_kwh   float32
+- date         datetime64 (parsed once here, not on every page)
+- datetime     date + hour
+
+Station and date-range filters are applied chunk by chunk (dates are
+pre-filtered as ISO strings before parsing), so memory grows with the
+requested slice rather than the whole fleet history. New hourly readings
+are appended to the CSV without rewriting it.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from ev_intelligence.paths import DATA_PATH
+
+COLUMNS = ["date", "hour", "station_id", "energy_kwh"]
+CSV_DTYPES = {"date": str, "hour": np.int8, "station_id": str, "energy_kwh": np.float32}
+CHUNK_SIZE = 500_000
+
+
+def _day_string(value):
+    return pd.Timestamp(value).strftime("%Y-%m-%d")
+
+
+def read_history(path=DATA_PATH, stations=None, start=None, end=None, chunksize=CHUNK_SIZE):
+    """
+    Input:
+    - path (str): history CSV
+    - stations (list): keep only these station ids (default: all)
+    - start, end (str or Timestamp): keep readings with start <= datetime <= end
+
+    Output:
+    - history (DataFrame): date, hour, station_id, energy_kwh, datetime
+    """
+    if stations is not None:
+        stations = set(stations)
+
+    parts = []
+    for chunk in pd.read_csv(path, dtype=CSV_DTYPES, usecols=COLUMNS, chunksize=chunksize):
+        if stations is not None:
+            chunk = chunk[chunk["station_id"].isin(stations)]
+        if start is not None:
+            chunk = chunk[chunk["date"] >= _day_string(start)]
+        if end is not None:
+            chunk = chunk[chunk["date"] <= _day_string(end)]
+        parts.append(chunk)
+
+    history = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=COLUMNS)
+
+    history["station_id"] = history["station_id"].astype("category")
+    history["hour"] = history["hour"].astype(np.int8)
+    history["energy_kwh"] = history["energy_kwh"].astype(np.float32)
+    history["date"] = pd.to_datetime(history["date"], format="%Y-%m-%d")
+    history["datetime"] = history["date"] + pd.to_timedelta(history["hour"].astype(np.int64), unit="h")
+
+    if start is not None:
+        history = history[history["datetime"] >= pd.Timestamp(start)]
+    if end is not None:
+        history = history[history["datetime"] <= pd.Timestamp(end)]
+
+    return history.reset_index(drop=True)
+
+
+def read_station_ids(path=DATA_PATH, chunksize=CHUNK_SIZE):
+    """Sorted station ids, reading only the station_id column."""
+    stations = set()
+    for chunk in pd.read_csv(path, usecols=["station_id"], dtype=str, chunksize=chunksize):
+        stations.update(chunk["station_id"].unique())
+    return sorted(stations)
+
+
+def append_readings(readings, path=DATA_PATH):
+    """
+    Append hourly readings (date, hour, station_id, energy_kwh) to the
+    history CSV in its existing format.
+    """
+    missing = [col for col in COLUMNS if col not in readings.columns]
+    if missing:
+        raise ValueError(f"Readings are missing columns: {missing}")
+
+    readings = readings[COLUMNS]
+    if readings.isna().any().any():
+        raise ValueError("Readings contain missing values")
+
+    rows = pd.DataFrame({
+        "date": pd.to_datetime(readings["date"]).dt.strftime("%Y-%m-%d"),
+        "hour": readings["hour"].astype(int),
+        "station_id": readings["station_id"].astype(str),
+        "energy_kwh": readings["energy_kwh"].astype(float).round(2)
+    })
+
+    new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+
+    with open(path, "a+b") as f:
+        if not new_file:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+        f.write(rows.to_csv(index=False, header=new_file).encode())
+
+    return len(rows)
@@ -0,0 +1,543 @@
+"""
+Live Ingestion Service
+----------------------
+Consumes hourly station readings from a pluggable source and keeps the
+fleet risk picture current:
+
+1. readings update each station's 24-hour feature window and the online
+   statistics,
+2. every station is forecast once at start-up; after that only stations
+   that received data are re-forecast (24h recursive), in batches small
+   enough for the flat forest, spread over --workers threads,
+3. a risk snapshot (peak forecast, utilization, risk level per station) is
+   written atomically to data/live/risk_snapshot.parquet for Grid_Risk_Map,
+4. readings are persisted in the background: appended to the history CSV
+   and the columnar store, the rollups are carried forward to the new data
+   version (the superseded version's cache files are pruned) and the online
+   statistics snapshot is saved.
+
+Unless started with --model, the service follows the model registry: before
+each batch it checks the current version and, when it changed, loads it and
+re-forecasts every station with the new model.
+
+Latency from a batch being received to its risk snapshot being written is
+recorded per batch; readings carrying a `sent_at` epoch also give the
+producer-to-snapshot latency.
+
+Sources (the local stand-ins for a real feed):
+- FileTailSource  follows a CSV of readings as it grows (tail -f)
+- SocketSource    newline-delimited JSON readings over TCP
+
+Usage:
+    python -m ev_intelligence.live_service serve --source tail
+    python -m ev_intelligence.live_service feed --target tail --hours 3 --interval 2
+"""
+import argparse
+import asyncio
+import copy
+import io
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from ev_intelligence.atomic import atomic_path
+from ev_intelligence.decision import decision_engine_batch
+from ev_intelligence.demand_tensor import open_tensor
+from ev_intelligence.fast_forest import FLAT_MAX_ROWS
+from ev_intelligence.feature_state import WINDOW, FeatureState
+from ev_intelligence.feature_store import source_fingerprint
+from ev_intelligence.forecasting import recursive_forecast
+from ev_intelligence.history_store import STORE_DIR, append_to_store, ensure_store
+from ev_intelligence.ingestion import COLUMNS, append_readings
+from ev_intelligence.model_registry import current_model_path, load_model
+from ev_intelligence.online_stats import load_online_stats, snapshot_path
+from ev_intelligence.paths import (
+    DATA_PATH,
+    LIVE_DIR,
+    METADATA_PATH,
+    RISK_SNAPSHOT_PATH
+)
+from ev_intelligence.rollups import advance_rollups, prune_version, rollup_path
+from ev_intelligence.tables import read_table, write_table
+
+FEED_PATH = os.path.join(LIVE_DIR, "feed.csv")
+DEFAULT_PORT = 8765
+HORIZON = 24
+
+
+# --------------------------------------------------
+# Sources
+# --------------------------------------------------
+class FileTailSource:
+    """
+    Follow a CSV of readings (date, hour, station_id, energy_kwh[, sent_at]).
+    Only rows appended after the service starts are consumed.
+    """
+
+    def __init__(self, path=FEED_PATH, poll_interval=0.05):
+        self.path = path
+        self.poll_interval = poll_interval
+
+    async def batches(self):
+        if not os.path.exists(self.path):
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "w") as f:
+                f.write(",".join(COLUMNS + ["sent_at"]) + "\n")
+
+        with open(self.path) as f:
+            header = f.readline()
+            f.seek(0, os.SEEK_END)
+            pending = ""
+
+            while True:
+                chunk = f.read()
+                if not chunk:
+                    await asyncio.sleep(self.poll_interval)
+                    continue
+
+                received_at = time.perf_counter()
+                pending += chunk
+                complete, _, pending = pending.rpartition("\n")
+                if complete:
+                    yield pd.read_csv(io.StringIO(header + complete + "\n")), received_at
+
+
+class SocketSource:
+    """
+    TCP server accepting newline-delimited JSON readings, one object (or a
+    list of objects) per line. Readings that arrive while a batch is being
+    processed are coalesced into the next batch.
+    """
+
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT, max_batch=100_000):
+        self.host = host
+        self.port = port
+        self.max_batch = max_batch
+        self._queue = asyncio.Queue()
+
+    async def _handle(self, reader, writer):
+        while line := await reader.readline():
+            received_at = time.perf_counter()
+            readings = json.loads(line)
+            for reading in readings if isinstance(readings, list) else [readings]:
+                self._queue.put_nowait((reading, received_at))
+        writer.close()
+
+    async def batches(self):
+        server = await asyncio.start_server(self._handle, self.host, self.port)
+
+        async with server:
+            while True:
+                reading, received_at = await self._queue.get()
+                readings = [reading]
+
+                while not self._queue.empty() and len(readings) < self.max_batch:
+                    readings.append(self._queue.get_nowait()[0])
+
+                yield pd.DataFrame(readings), received_at
+
+
+# --------------------------------------------------
+# Service
+# --------------------------------------------------
+class LiveService:
+
+    def __init__(
+        self,
+        model,
+        data_path=DATA_PATH,
+        metadata_path=METADATA_PATH,
+        store_dir=STORE_DIR,
+        risk_path=RISK_SNAPSHOT_PATH,
+        stats_path=None,
+        horizon=HORIZON,
+        flush_interval=5.0,
+        follow_registry=False,
+        workers=1
+    ):
+        self.model = model
+        self.model_path = getattr(model, "model_path", None)
+        self.feature_cols = list(model.feature_names_in_)
+        self.follow_registry = follow_registry
+        self.data_path = data_path
+        self.metadata_path = metadata_path
+        self.store_dir = store_dir
+        self.risk_path = risk_path
+        self.stats_path = stats_path or snapshot_path(data_path)
+        self.horizon = horizon
+        self.flush_interval = flush_interval
+
+        # NumPy releases the GIL inside the forest traversal, so threads are enough
+        self._pool = ThreadPoolExecutor(workers) if workers > 1 else None
+
+        ensure_store(data_path, store_dir)
+        tensor = open_tensor(data_path, metadata_path)
+        self.online_stats = load_online_stats(data_path, metadata_path, self.stats_path)
+
+        # Per-station feature window, oldest to newest; NaN until 24 readings are known
+        self.stations = list(tensor.stations)
+        self.index = {station: i for i, station in enumerate(self.stations)}
+        self.window = np.full((len(self.stations), WINDOW), np.nan)
+        self.last_hour = np.full(len(self.stations), np.iinfo(np.int64).min // 2)
+
+        known, recent, last_timestamp = tensor.recent(n=WINDOW)
+        rows = self._rows(known)
+        self.window[rows] = recent
+        self.last_hour[rows] = last_timestamp.astype(np.int64)
+
+        metadata = pd.read_csv(metadata_path).set_index("station_id")
+        self.capacity = metadata["capacity_kw"].reindex(self.stations).to_numpy(dtype=float)
+        self.peak = np.full(len(self.stations), np.nan)
+        self.updated_at = np.full(len(self.stations), np.datetime64("NaT"), dtype="datetime64[s]")
+
+        self._pending = []
+        self.latencies = deque(maxlen=10_000)
+        self.end_to_end = deque(maxlen=10_000)
+        self.counters = {"batches": 0, "readings": 0, "stale": 0, "forecast_rows": 0, "model_swaps": 0}
+
+        # The snapshot covers the whole fleet from the first write
+        self.refresh(np.arange(len(self.stations)))
+
+    def _rows(self, stations):
+        """Row index of each station, adding unseen stations."""
+        for station in stations:
+            if station not in self.index:
+                self.index[station] = len(self.stations)
+                self.stations.append(station)
+                self.window = np.vstack([self.window, np.full((1, WINDOW), np.nan)])
+                self.last_hour = np.append(self.last_hour, np.iinfo(np.int64).min // 2)
+                self.capacity = np.append(self.capacity, np.nan)
+                self.peak = np.append(self.peak, np.nan)
+                self.updated_at = np.append(self.updated_at, np.datetime64("NaT", "s"))
+        return np.array([self.index[s] for s in stations], dtype=np.int64)
+
+    # --------------------------------------------------
+    # State Update
+    # --------------------------------------------------
+    def ingest(self, readings):
+        """
+        Advance the windows of the stations in readings.
+
+        Output:
+        - accepted (DataFrame): readings newer than each station's last one
+        - touched (ndarray): rows of stations that received data
+        """
+        readings = readings.assign(station_id=readings["station_id"].astype(str))
+        hour_index = (
+            pd.to_datetime(readings["date"]).to_numpy().astype("datetime64[h]").astype(np.int64)
+            + readings["hour"].to_numpy(dtype=np.int64)
+        )
+
+        order = np.lexsort((hour_index, readings["station_id"].to_numpy()))
+        readings = readings.iloc[order].reset_index(drop=True)
+        hour_index = hour_index[order]
+
+        station_ids, inverse = np.unique(readings["station_id"].to_numpy(), return_inverse=True)
+        rows = self._rows(station_ids)[inverse]
+        values = readings["energy_kwh"].to_numpy(dtype=float)
+
+        accepted = np.zeros(len(readings), dtype=bool)
+        rank = readings.groupby("station_id", sort=False).cumcount().to_numpy()
+
+        # k-th reading of every station in one vectorized step
+        for k in range(rank.max() + 1 if len(rank) else 0):
+            take = np.flatnonzero(rank == k)
+            r, h, v = rows[take], hour_index[take], values[take]
+
+            gap = h - self.last_hour[r]
+            fresh = gap > 0
+            take, r, h, v, gap = take[fresh], r[fresh], h[fresh], v[fresh], gap[fresh]
+
+            # Shift each window by its gap; missing hours repeat the last value
+            shift = np.minimum(gap, WINDOW)
+            source = np.arange(WINDOW) + shift[:, None]
+            shifted = np.where(
+                source < WINDOW,
+                self.window[r[:, None], np.minimum(source, WINDOW - 1)],
+                self.window[r, -1][:, None]
+            )
+            shifted[:, -1] = v
+
+            self.window[r] = shifted
+            self.last_hour[r] = h
+            accepted[take] = True
+
+        self.counters["stale"] += int((~accepted).sum())
+        accepted_rows = readings[accepted]
+
+        if len(accepted_rows):
+            self.online_stats.update_batch(
+                accepted_rows["station_id"].to_numpy(),
+                values[accepted],
+                hour_index[accepted].astype("datetime64[h]")
+            )
+
+        return accepted_rows, np.unique(rows[accepted])
+
+    def swap_model(self):
+        """Load the registry's current version if it changed; True on a swap."""
+        path = current_model_path(self.model_path)
+        if path == self.model_path:
+            return False
+
+        model = load_model(path, self.data_path)
+        self.model, self.model_path = model, path
+        self.feature_cols = list(model.feature_names_in_)
+        self.counters["model_swaps"] += 1
+        return True
+
+    def _forecast(self, rows):
+        state = FeatureState(
+            self.window[rows],
+            self.last_hour[rows].astype("datetime64[h]"),
+            np.array(self.stations)[rows],
+            self.feature_cols
+        )
+        return recursive_forecast(self.model, state, self.horizon)
+
+    def refresh(self, rows):
+        """Re-forecast the given station rows and update their risk."""
+        rows = rows[~np.isnan(self.window[rows]).any(axis=1)]
+        if not len(rows):
+            return rows
+
+        # Batches of at most FLAT_MAX_ROWS stay on the flat forest
+        chunks = [rows[start:start + FLAT_MAX_ROWS] for start in range(0, len(rows), FLAT_MAX_ROWS)]
+        mapper = self._pool.map if self._pool is not None else map
+        forecasts = np.concatenate(list(mapper(self._forecast, chunks)))
+
+        self.peak[rows] = forecasts.max(axis=1)
+        self.updated_at[rows] = np.datetime64(int(time.time()), "s")
+        self.counters["forecast_rows"] += len(rows)
+        return rows
+
+    def risk_snapshot(self):
+        known = np.flatnonzero(~np.isnan(self.peak) & ~np.isnan(self.capacity))
+        decisions = decision_engine_batch(self.peak[known], self.capacity[known])
+
+        return pd.DataFrame({
+            "station_id": np.array(self.stations)[known],
+            "last_reading": self.last_hour[known].astype("datetime64[h]"),
+            "predicted_peak": self.peak[known],
+            "capacity_kw": self.capacity[known],
+            "utilization_pct": decisions["utilization_ratio"].to_numpy() * 100,
+            "risk_level": decisions["risk_level"].astype(str).to_numpy(),
+            "action": decisions["action"].astype(str).to_numpy(),
+            "updated_at": self.updated_at[known]
+        })
+
+    def write_snapshot(self):
+        with atomic_path(self.risk_path, os.path.splitext(self.risk_path)[1]) as tmp_path:
+            write_table(self.risk_snapshot(), tmp_path)
+
+    # --------------------------------------------------
+    # Persistence
+    # --------------------------------------------------
+    def _persist(self, readings):
+        previous = source_fingerprint(self.data_path)
+        previous_rollups = rollup_path(self.data_path, self.metadata_path)
+
+        append_readings(readings, self.data_path)
+        fingerprint = append_to_store(readings, self.data_path, self.store_dir)["source_fingerprint"]
+
+        advance_rollups(readings, previous_rollups, rollup_path(self.data_path, self.metadata_path))
+        prune_version(previous)
+        return fingerprint
+
+    async def flush(self):
+        """Write pending readings to the CSV and store, then snapshot online stats."""
+        if not self._pending:
+            return
+
+        readings = pd.concat(self._pending, ignore_index=True)[COLUMNS]
+        self._pending = []
+
+        # Taken together with the batch: readings ingested while it is being
+        # written are not in the CSV yet and must not carry its fingerprint
+        online_stats = copy.deepcopy(self.online_stats)
+
+        loop = asyncio.get_running_loop()
+        online_stats.source_fingerprint = await loop.run_in_executor(None, self._persist, readings)
+        await loop.run_in_executor(None, online_stats.save, self.stats_path)
+
+    async def _flush_periodically(self, stop):
+        # Stopped via the event rather than cancelled, so a flush running in
+        # the executor always completes before the final one starts
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                await self.flush()
+
+    # --------------------------------------------------
+    # Main Loop
+    # --------------------------------------------------
+    async def process(self, readings, received_at):
+        accepted, touched = self.ingest(readings)
+
+        # Queued right away, so the online stats never hold readings that a
+        # flush running meanwhile does not know about
+        if len(accepted):
+            self._pending.append(accepted)
+
+        # Forecasting runs off the event loop so sources keep receiving
+        loop = asyncio.get_running_loop()
+        if self.follow_registry and await loop.run_in_executor(None, self.swap_model):
+            # Every peak in the snapshot must come from the same version
+            touched = np.arange(len(self.stations))
+        await loop.run_in_executor(None, self.refresh, touched)
+        await loop.run_in_executor(None, self.write_snapshot)
+
+        self.latencies.append(time.perf_counter() - received_at)
+        if "sent_at" in readings.columns:
+            self.end_to_end.append(time.time() - readings["sent_at"].min())
+
+        self.counters["batches"] += 1
+        self.counters["readings"] += len(readings)
+
+    async def run(self, source, max_batches=None):
+        await asyncio.get_running_loop().run_in_executor(None, self.write_snapshot)
+
+        stop = asyncio.Event()
+        flusher = asyncio.create_task(self._flush_periodically(stop))
+        try:
+            async for readings, received_at in source.batches():
+                await self.process(readings, received_at)
+                if max_batches and self.counters["batches"] >= max_batches:
+                    break
+        finally:
+            stop.set()
+            await flusher
+            await self.flush()
+            if self._pool is not None:
+                self._pool.shutdown()
+
+    def metrics(self):
+        def percentiles(values):
+            if not values:
+                return {"p50_ms": None, "p99_ms": None}
+            p50, p99 = np.percentile(np.array(values) * 1000, [50, 99])
+            return {"p50_ms": round(float(p50), 1), "p99_ms": round(float(p99), 1)}
+
+        return {
+            **self.counters,
+            "model_version": self.model.version if hasattr(self.model, "version") else None,
+            "processing": percentiles(self.latencies),
+            "end_to_end": percentiles(self.end_to_end)
+        }
+
+
+def load_risk_snapshot(path=RISK_SNAPSHOT_PATH):
+    """Latest live risk snapshot, or None if the service has not written one."""
+    if not os.path.exists(path):
+        return None
+    return read_table(path)
+
+
+# --------------------------------------------------
+# Stand-in Feed
+# --------------------------------------------------
+def simulated_readings(online_stats, stations, timestamp, rng):
+    """
+    One hour of readings per station drawn from each station's running
+    hourly profile (mean +- std).
+    """
+    hour = int(timestamp.astype(np.int64) % 24)
+    rows = [online_stats.index[s] for s in stations]
+
+    mean = online_stats.hour_mean[rows, hour]
+    std = np.sqrt(online_stats.hour_m2[rows, hour] / np.maximum(online_stats.hour_count[rows, hour] - 1, 1))
+
+    return pd.DataFrame({
+        "date": str(timestamp.astype("datetime64[D]")),
+        "hour": hour,
+        "station_id": stations,
+        "energy_kwh": np.maximum(rng.normal(mean, std), 0).round(2)
+    })
+
+
+async def feed(args):
+    online_stats = load_online_stats(args.data, args.metadata)
+    stations = list(online_stats.stations)
+    rng = np.random.default_rng(args.seed)
+
+    writer = None
+    if args.target == "socket":
+        _, writer = await asyncio.open_connection(args.host, args.port)
+
+    for step in range(1, args.hours + 1):
+        timestamp = np.datetime64(int(online_stats.last_hour.max()) + step, "h")
+        readings = simulated_readings(online_stats, stations, timestamp, rng)
+        readings["sent_at"] = time.time()
+
+        if writer is not None:
+            writer.write((json.dumps(readings.to_dict("records")) + "\n").encode())
+            await writer.drain()
+        else:
+            with open(args.feed, "a") as f:
+                f.write(readings.to_csv(index=False, header=False))
+
+        print(f"Sent {len(readings)} readings for {timestamp}")
+        await asyncio.sleep(args.interval)
+
+    if writer is not None:
+        writer.close()
+        await writer.wait_closed()
+
+
+async def serve(args):
+    service = LiveService(
+        load_model(args.model or current_model_path(), args.data),
+        args.data,
+        args.metadata,
+        horizon=args.horizon,
+        flush_interval=args.flush_interval,
+        follow_registry=args.model is None,
+        workers=args.workers
+    )
+
+    if args.source == "socket":
+        source = SocketSource(args.host, args.port)
+    else:
+        source = FileTailSource(args.feed)
+
+    print(f"Tracking {len(service.stations)} stations from {args.source} source")
+    try:
+        await service.run(source, args.max_batches)
+    finally:
+        print(json.dumps(service.metrics(), indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Live EV reading ingestion and risk refresh.")
+    parser.add_argument("command", choices=["serve", "feed"])
+    parser.add_argument("--source", "--target", dest="source", choices=["tail", "socket"], default="tail")
+    parser.add_argument("--feed", default=FEED_PATH, help="CSV followed by the tail source")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--horizon", type=int, default=HORIZON)
+    parser.add_argument("--flush-interval", type=float, default=5.0)
+    parser.add_argument("--max-batches", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="serve: forecast threads")
+    parser.add_argument("--hours", type=int, default=1, help="feed: hours of readings to send")
+    parser.add_argument("--interval", type=float, default=1.0, help="feed: seconds between hours")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--model", default=None, help="serve this model file instead of following the registry")
+    parser.add_argument("--data", default=DATA_PATH)
+    parser.add_argument("--metadata", default=METADATA_PATH)
+    args = parser.parse_args()
+    args.target = args.source
+
+    try:
+        asyncio.run(serve(args) if args.command == "serve" else feed(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
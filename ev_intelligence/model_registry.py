@@ -0,0 +1,454 @@
+"""
+Model Registry
+--------------
+Trained models are published as immutable versions under models/registry/:
+
+    models/registry/<version>/model.pkl (+ sidecars below)
+    models/registry/CURRENT      name of the version being served
+
+register_model() writes a version into a temporary directory and renames it
+into place; promoting a version rewrites CURRENT with os.replace, so running
+processes see either the old or the new version, never a partial one. The
+app resolves CURRENT on every run (current_model_path), which makes a new
+version live without restarting sessions. Only models whose features the
+forecasting pipeline can build may be promoted.
+
+Unpickling the 200-tree forest takes seconds, yet most pages only need its
+feature names and importances. Next to each model artifact the registry keeps:
+
+- <model>_meta.json   feature names, importances, hyper-parameters, hold-out
+                      metrics, residual summary and the model's content hash
+- <model>_forest.*/   the flattened forest as .npy node arrays (memory-mapped);
+                      every export writes a new directory named in the sidecar
+- <model>_residuals.npz  residual statistics (see residuals.py)
+
+load_model() returns a ModelHandle that answers metadata questions from the
+JSON sidecar immediately. Small prediction batches run on the memory-mapped
+forest; the pickled estimator is only unpickled when a large batch needs it.
+Artifacts are (re)built from the pickle the first time a model is loaded
+without an up-to-date sidecar.
+
+Usage:
+    python -m ev_intelligence.model_registry list
+    python -m ev_intelligence.model_registry register --model models/ev_demand_model.pkl
+    python -m ev_intelligence.model_registry promote <version>
+    python -m ev_intelligence.model_registry export [--model PATH] [--data PATH]
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import threading
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from ev_intelligence.atomic import atomic_path, write_json
+from ev_intelligence.fast_forest import FlatForest, forest_path
+from ev_intelligence.feature_store import load_features, source_fingerprint
+from ev_intelligence.features import BASE_FEATURES
+from ev_intelligence.paths import DATA_PATH, MODEL_PATH, MODELS_DIR
+from ev_intelligence.residuals import (
+    compute_residual_stats,
+    load_residual_stats,
+    residual_stats_path,
+    save_residual_stats
+)
+
+
+REGISTRY_DIR = os.path.join(MODELS_DIR, "registry")
+MODEL_FILE = "model.pkl"
+
+
+def metadata_path(model_path=MODEL_PATH):
+    return os.path.splitext(model_path)[0] + "_meta.json"
+
+
+def _file_signature(path):
+    stat = os.stat(path)
+    return {"model_size": stat.st_size, "model_mtime_ns": stat.st_mtime_ns}
+
+
+def holdout_metrics(residual_stats):
+    """MAE / RMSE on the hold-out arrays stored with the residual statistics."""
+    actual = residual_stats["test_actual"]
+    error = actual - residual_stats["test_pred"]
+    return {
+        "mae": float(np.mean(np.abs(error))),
+        "rmse": float(np.sqrt(np.mean(error ** 2))),
+        "n_test": int(len(actual))
+    }
+
+
+def export_model_artifacts(model, model_path=MODEL_PATH, residual_stats=None, metrics=None, extra=None):
+    """
+    Write the metadata sidecar (and the flattened forest, for tree ensembles)
+    for a fitted model saved at model_path. metrics overrides the hold-out
+    metrics derived from residual_stats; extra is merged into the sidecar.
+
+    Output:
+    - metadata (dict): contents of <model>_meta.json
+    """
+    try:
+        forest = FlatForest.from_model(model)
+    except (AttributeError, ValueError):
+        forest = None
+
+    # Forest the current sidecar points to, removed once the new one is live
+    previous = None
+    if os.path.exists(metadata_path(model_path)):
+        with open(metadata_path(model_path)) as f:
+            previous = json.load(f).get("forest")
+
+    forest_dir = None if forest is None else forest.save(forest_path(model_path))
+
+    importances = getattr(model, "feature_importances_", None)
+    params = model.get_params() if hasattr(model, "get_params") else {}
+
+    metadata = {
+        "model_file": os.path.basename(model_path),
+        "model_hash": source_fingerprint(model_path),
+        **_file_signature(model_path),
+        "model_type": type(model).__name__,
+        "params": {k: v for k, v in params.items() if isinstance(v, (int, float, str, bool, type(None)))},
+        "feature_names": [str(name) for name in model.feature_names_in_],
+        "feature_importances": None if importances is None else [float(v) for v in importances],
+        "forest": None if forest_dir is None else os.path.basename(forest_dir),
+        "metrics": None,
+        "residuals": None,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S")
+    }
+
+    if residual_stats is not None:
+        metadata["metrics"] = holdout_metrics(residual_stats)
+        metadata["residuals"] = {
+            "file": os.path.basename(residual_stats_path(model_path)),
+            "overall_std": float(residual_stats["overall_std"]),
+            "split": str(residual_stats["test_split"])
+        }
+
+    if metrics is not None:
+        metadata["metrics"] = {**(metadata["metrics"] or {}), **{k: float(v) for k, v in metrics.items()}}
+
+    metadata.update(extra or {})
+
+    write_json(metadata_path(model_path), metadata, indent=2)
+
+    if previous is not None and previous != metadata["forest"]:
+        shutil.rmtree(os.path.join(os.path.dirname(model_path), previous), ignore_errors=True)
+    return metadata
+
+
+def read_metadata(model_path=MODEL_PATH):
+    """
+    Sidecar metadata, or None if it is missing or belongs to a different
+    model file. Unchanged size/mtime is trusted; otherwise the content hash
+    decides. Never writes: the sidecar is only (re)written by
+    export_model_artifacts().
+    """
+    path = metadata_path(model_path)
+    if not os.path.exists(path) or not os.path.exists(model_path):
+        return None
+
+    with open(path) as f:
+        metadata = json.load(f)
+
+    # Hold-out metrics from before the time-based split are rebuilt
+    if metadata["residuals"] is not None and "split" not in metadata["residuals"]:
+        return None
+
+    signature = _file_signature(model_path)
+    if all(metadata.get(key) == value for key, value in signature.items()):
+        return metadata
+
+    # Same content, new mtime (e.g. copied): still valid, checked by hash
+    if metadata.get("model_hash") != source_fingerprint(model_path):
+        return None
+    return metadata
+
+
+class ModelHandle:
+    """
+    Stand-in for the fitted estimator: feature metadata is read from the
+    sidecar, the flattened forest and the estimator are loaded on first use.
+    """
+
+    def __init__(self, model_path, metadata, estimator=None):
+        self.model_path = model_path
+        self.metadata = metadata
+
+        self.feature_names_in_ = np.array(metadata["feature_names"], dtype=object)
+        self.n_features_in_ = len(self.feature_names_in_)
+        if metadata["feature_importances"] is not None:
+            self.feature_importances_ = np.array(metadata["feature_importances"])
+
+        self._estimator = estimator
+        self._forest = None
+        self._lock = threading.Lock()
+
+    @property
+    def version(self):
+        """Registry version, or the content hash for unregistered models."""
+        return self.metadata.get("version") or self.metadata["model_hash"]
+
+    @property
+    def metrics(self):
+        return self.metadata["metrics"]
+
+    @property
+    def flat_forest(self):
+        """Memory-mapped flattened forest, or None for non-forest models."""
+        if self._forest is None and self.metadata["forest"] is not None:
+            with self._lock:
+                if self._forest is None:
+                    directory = os.path.join(os.path.dirname(self.model_path), self.metadata["forest"])
+                    self._forest = FlatForest.load(directory, mmap_mode="r")
+        return self._forest
+
+    @property
+    def estimator(self):
+        """The unpickled scikit-learn estimator (loaded on first access)."""
+        if self._estimator is None:
+            with self._lock:
+                if self._estimator is None:
+                    self._estimator = joblib.load(self.model_path)
+        return self._estimator
+
+    def predict(self, X):
+        return self.estimator.predict(X)
+
+
+def load_model(model_path=MODEL_PATH, data_path=DATA_PATH):
+    """
+    ModelHandle for model_path. The first load of a new artifact unpickles
+    it once to write the sidecar, the flattened forest and, if missing, the
+    residual statistics (computed over data_path).
+    """
+    metadata = read_metadata(model_path)
+    if metadata is not None:
+        return ModelHandle(model_path, metadata)
+
+    estimator = joblib.load(model_path)
+
+    residual_stats = load_residual_stats(model_path)
+    if residual_stats is None and data_path is not None and os.path.exists(data_path):
+        residual_stats = compute_residual_stats(estimator, load_features(data_path))
+        save_residual_stats(residual_stats, model_path)
+
+    # Keep the registry fields of a version whose sidecar is being rebuilt
+    registry_fields = {}
+    if os.path.exists(metadata_path(model_path)):
+        with open(metadata_path(model_path)) as f:
+            previous = json.load(f)
+        registry_fields = {
+            key: previous[key] for key in ("version", "data_file", "data_fingerprint", "source")
+            if key in previous
+        }
+
+    metadata = export_model_artifacts(estimator, model_path, residual_stats, extra=registry_fields)
+    return ModelHandle(model_path, metadata, estimator)
+
+
+# --------------------------------------------------
+# Versioned Registry
+# --------------------------------------------------
+def check_schema(feature_names):
+    """Raise ValueError if the forecasting pipeline cannot build these features."""
+    unsupported = [
+        name for name in feature_names
+        if name not in BASE_FEATURES and not str(name).startswith("station_id_")
+    ]
+    if unsupported:
+        raise ValueError(
+            f"Features {unsupported} are not produced by the forecasting pipeline "
+            f"(supported: {BASE_FEATURES} and station_id_* dummies)"
+        )
+
+
+def version_model_path(version, root=REGISTRY_DIR):
+    return os.path.join(root, version, MODEL_FILE)
+
+
+def current_version(root=REGISTRY_DIR):
+    """Name of the served version, or None for an empty registry."""
+    try:
+        with open(os.path.join(root, "CURRENT")) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def current_model_path(default=MODEL_PATH, root=REGISTRY_DIR):
+    """Model file of the served version; default when nothing is registered."""
+    version = current_version(root)
+    if version is None:
+        return default
+    return version_model_path(version, root)
+
+
+def set_current(version, root=REGISTRY_DIR):
+    """Atomically point CURRENT at version (promotion and rollback)."""
+    metadata = read_metadata(version_model_path(version, root))
+    if metadata is None:
+        raise ValueError(f"Unknown or incomplete model version '{version}'")
+    check_schema(metadata["feature_names"])
+
+    with atomic_path(os.path.join(root, "CURRENT")) as tmp_path:
+        with open(tmp_path, "w") as f:
+            f.write(version + "\n")
+
+
+def register_model(
+    model,
+    data_path=DATA_PATH,
+    residual_stats=None,
+    metrics=None,
+    source=None,
+    activate=True,
+    root=REGISTRY_DIR
+):
+    """
+    Publish a fitted model as a new immutable version.
+
+    Input:
+    - model: fitted estimator with feature_names_in_
+    - data_path (str): training data, recorded by fingerprint
+    - residual_stats (dict): output of compute_residual_stats (optional)
+    - metrics (dict): evaluation metrics, e.g. {"mae": ..., "rmse": ...}
+    - source (str): where the model was trained (notebook, CLI)
+    - activate (bool): make it the served version
+
+    Output:
+    - version (str)
+    """
+    if activate:
+        check_schema(model.feature_names_in_)
+
+    os.makedirs(root, exist_ok=True)
+
+    version = time.strftime("%Y%m%dT%H%M%S")
+    tmp_dir = os.path.join(root, f".tmp-{version}-{os.getpid()}")
+    os.makedirs(tmp_dir)
+
+    model_path = os.path.join(tmp_dir, MODEL_FILE)
+    joblib.dump(model, model_path)
+    version = f"{version}-{source_fingerprint(model_path)[:8]}"
+
+    if residual_stats is not None:
+        save_residual_stats(residual_stats, model_path)
+
+    export_model_artifacts(model, model_path, residual_stats, metrics, extra={
+        "version": version,
+        "data_file": None if data_path is None else os.path.basename(data_path),
+        "data_fingerprint": None if data_path is None else source_fingerprint(data_path),
+        "source": source
+    })
+
+    final_dir = os.path.join(root, version)
+    os.replace(tmp_dir, final_dir)
+
+    if activate:
+        set_current(version, root)
+
+    return version
+
+
+def list_versions(root=REGISTRY_DIR):
+    """
+    Output:
+    - versions (DataFrame): one row per registered version, newest first
+    """
+    current = current_version(root)
+    rows = []
+
+    if os.path.isdir(root):
+        for version in sorted(os.listdir(root), reverse=True):
+            if not re.match(r"^\d{8}T\d{6}-[0-9a-f]{8}$", version):
+                continue
+            path = metadata_path(version_model_path(version, root))
+            if not os.path.exists(path):
+                continue
+            with open(path) as f:
+                metadata = json.load(f)
+
+            metrics = metadata.get("metrics") or {}
+            rows.append({
+                "version": version,
+                "current": version == current,
+                "model_type": metadata["model_type"],
+                "n_features": len(metadata["feature_names"]),
+                "mae": metrics.get("mae"),
+                "rmse": metrics.get("rmse"),
+                "data_fingerprint": metadata.get("data_fingerprint"),
+                "source": metadata.get("source"),
+                "created_at": metadata["created_at"]
+            })
+
+    return pd.DataFrame(rows, columns=[
+        "version", "current", "model_type", "n_features", "mae", "rmse",
+        "data_fingerprint", "source", "created_at"
+    ])
+
+
+def prune_versions(keep=5, root=REGISTRY_DIR):
+    """Delete all but the newest `keep` versions (never the current one)."""
+    versions = list_versions(root)
+    stale = versions[~versions["current"]].iloc[max(keep - 1, 0):]["version"]
+    for version in stale:
+        shutil.rmtree(os.path.join(root, version))
+    return list(stale)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage versioned model artifacts.")
+    parser.add_argument("command", choices=["list", "register", "promote", "export"])
+    parser.add_argument("version", nargs="?", help="promote: version to serve")
+    parser.add_argument("--model", default=MODEL_PATH, help="register/export: pickled model")
+    parser.add_argument("--data", default=DATA_PATH)
+    parser.add_argument("--no-activate", action="store_true", help="register without serving it")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        print(list_versions().to_string(index=False))
+        return
+
+    if args.command == "promote":
+        if not args.version:
+            parser.error("promote needs a version")
+        try:
+            set_current(args.version)
+        except ValueError as error:
+            parser.error(str(error))
+        print(f"Serving version {args.version}")
+        return
+
+    estimator = joblib.load(args.model)
+
+    residual_stats = load_residual_stats(args.model)
+    if residual_stats is None:
+        residual_stats = compute_residual_stats(estimator, load_features(args.data))
+        save_residual_stats(residual_stats, args.model)
+
+    if args.command == "register":
+        version = register_model(
+            estimator,
+            args.data,
+            residual_stats,
+            source=os.path.basename(args.model),
+            activate=not args.no_activate
+        )
+        print(f"Registered version {version}" + ("" if args.no_activate else " (serving)"))
+        return
+
+    metadata = export_model_artifacts(estimator, args.model, residual_stats)
+
+    print(f"Metadata written to: {metadata_path(args.model)}")
+    print(f"Model hash: {metadata['model_hash']}")
+    print(f"Hold-out MAE: {metadata['metrics']['mae']:.3f}  RMSE: {metadata['metrics']['rmse']:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+"""
+Online Station Statistics
+-------------------------
+Per-station streaming state for the risk and stability metrics:
+
+- running count, mean and variance (Welford)
+- running max
+- per-hour-of-day mean and variance (Welford)
+- a fixed-width histogram sketch for quantiles
+- timestamp of the newest reading
+
+update() folds in one reading in O(1); update_batch() merges a block of
+readings with Chan's parallel formula, so bootstrapping from the demand
+tensor and live ingestion use the same arithmetic. The state is snapshot to
+data/cache/online_stats_<path key>.npz, one file per data file, together
+with the fingerprint of the content it reflects. The name follows the path
+rather than the content because the live service keeps updating the same
+snapshot as the file grows.
+"""
+import hashlib
+import os
+
+import numpy as np
+
+from ev_intelligence.atomic import save_npz
+from ev_intelligence.demand_tensor import open_tensor
+from ev_intelligence.feature_store import source_fingerprint
+from ev_intelligence.paths import CACHE_DIR, DATA_PATH, METADATA_PATH
+
+BIN_WIDTH = 0.25
+INITIAL_BINS = 256
+BLOCK_STATIONS = 256
+
+ARRAYS = [
+    "count", "mean", "m2", "peak",
+    "hour_count", "hour_mean", "hour_m2",
+    "sketch", "last_hour"
+]
+
+
+def snapshot_path(data_path=DATA_PATH, cache_dir=CACHE_DIR):
+    """Snapshot file of the data file at data_path."""
+    key = hashlib.sha1(os.path.abspath(data_path).encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, f"online_stats_{key}.npz")
+
+
+def _merge(count, mean, m2, batch_count, batch_mean, batch_m2):
+    """Chan et al. pairwise merge of (count, mean, M2) moment triples."""
+    total = count + batch_count
+    delta = batch_mean - mean
+    safe_total = np.maximum(total, 1)
+
+    mean = mean + delta * batch_count / safe_total
+    m2 = m2 + batch_m2 + delta ** 2 * count * batch_count / safe_total
+    return total, mean, m2
+
+
+def _group_moments(group, values, n_groups):
+    """(count, mean, M2) per group id using bincount."""
+    count = np.bincount(group, minlength=n_groups)
+    total = np.bincount(group, weights=values, minlength=n_groups)
+    mean = total / np.maximum(count, 1)
+    m2 = np.bincount(group, weights=(values - mean[group]) ** 2, minlength=n_groups)
+    return count, mean, m2
+
+
+class OnlineStats:
+
+    def __init__(self, stations, bin_width=BIN_WIDTH, source_fingerprint=None, **arrays):
+        self.stations = list(stations)
+        self.index = {station: i for i, station in enumerate(self.stations)}
+        self.bin_width = float(bin_width)
+        self.source_fingerprint = source_fingerprint
+
+        n = len(self.stations)
+        defaults = {
+            "count": np.zeros(n, dtype=np.int64),
+            "mean": np.zeros(n),
+            "m2": np.zeros(n),
+            "peak": np.full(n, np.nan),
+            "hour_count": np.zeros((n, 24), dtype=np.int64),
+            "hour_mean": np.zeros((n, 24)),
+            "hour_m2": np.zeros((n, 24)),
+            "sketch": np.zeros((n, INITIAL_BINS), dtype=np.int64),
+            "last_hour": np.full(n, np.iinfo(np.int64).min)
+        }
+
+        for name in ARRAYS:
+            setattr(self, name, arrays.get(name, defaults[name]))
+
+    # --------------------------------------------------
+    # Updates
+    # --------------------------------------------------
+    def _station_index(self, station):
+        i = self.index.get(station)
+        if i is None:
+            i = self.index[station] = len(self.stations)
+            self.stations.append(station)
+            self._grow(len(self.stations), self.sketch.shape[1])
+        return i
+
+    def _grow(self, n_stations, n_bins):
+        def pad(array, shape, fill=0):
+            if array.shape == shape:
+                return array
+            grown = np.full(shape, fill, dtype=array.dtype)
+            grown[tuple(slice(0, n) for n in array.shape)] = array
+            return grown
+
+        self.count = pad(self.count, (n_stations,))
+        self.mean = pad(self.mean, (n_stations,))
+        self.m2 = pad(self.m2, (n_stations,))
+        self.peak = pad(self.peak, (n_stations,), np.nan)
+        self.hour_count = pad(self.hour_count, (n_stations, 24))
+        self.hour_mean = pad(self.hour_mean, (n_stations, 24))
+        self.hour_m2 = pad(self.hour_m2, (n_stations, 24))
+        self.sketch = pad(self.sketch, (n_stations, n_bins))
+        self.last_hour = pad(self.last_hour, (n_stations,), np.iinfo(np.int64).min)
+
+    def update(self, station, value, timestamp):
+        """Fold a single reading into the station's state in O(1)."""
+        i = self._station_index(station)
+        value = float(value)
+        hour_index = np.datetime64(timestamp, "h").astype(np.int64)
+        hour = hour_index % 24
+
+        self.count[i] += 1
+        delta = value - self.mean[i]
+        self.mean[i] += delta / self.count[i]
+        self.m2[i] += delta * (value - self.mean[i])
+
+        self.hour_count[i, hour] += 1
+        delta = value - self.hour_mean[i, hour]
+        self.hour_mean[i, hour] += delta / self.hour_count[i, hour]
+        self.hour_m2[i, hour] += delta * (value - self.hour_mean[i, hour])
+
+        self.peak[i] = np.fmax(self.peak[i], value)
+        self.last_hour[i] = max(self.last_hour[i], hour_index)
+
+        b = int(value // self.bin_width)
+        if b >= self.sketch.shape[1]:
+            self._grow(len(self.stations), max(b + 1, 2 * self.sketch.shape[1]))
+        self.sketch[i, max(b, 0)] += 1
+
+    def update_batch(self, stations, values, timestamps):
+        """
+        Merge a block of readings into the state.
+
+        Input:
+        - stations (array-like): station id of each reading
+        - values (array-like): energy_kwh of each reading
+        - timestamps (array-like): datetime64 of each reading
+        """
+        station_ids, inverse = np.unique(np.asarray(stations, dtype=str), return_inverse=True)
+        rows = np.array([self._station_index(s) for s in station_ids], dtype=np.int64)
+        self._merge_rows(
+            rows[inverse],
+            np.asarray(values, dtype=float),
+            np.asarray(timestamps).astype("datetime64[h]").astype(np.int64)
+        )
+
+    def _merge_rows(self, station, values, hour_index):
+        n = len(self.stations)
+        hour = hour_index % 24
+
+        self.count, self.mean, self.m2 = _merge(
+            self.count, self.mean, self.m2, *_group_moments(station, values, n)
+        )
+
+        cells = _group_moments(station * 24 + hour, values, n * 24)
+        self.hour_count, self.hour_mean, self.hour_m2 = _merge(
+            self.hour_count, self.hour_mean, self.hour_m2,
+            *(c.reshape(n, 24) for c in cells)
+        )
+
+        np.fmax.at(self.peak, station, values)
+        np.maximum.at(self.last_hour, station, hour_index)
+
+        bins = np.maximum((values // self.bin_width).astype(np.int64), 0)
+        n_bins = self.sketch.shape[1]
+        if len(bins) and bins.max() >= n_bins:
+            n_bins = max(int(bins.max()) + 1, 2 * n_bins)
+            self._grow(n, n_bins)
+        self.sketch += np.bincount(station * n_bins + bins, minlength=n * n_bins).reshape(n, n_bins)
+
+    @classmethod
+    def from_tensor(cls, tensor, bin_width=BIN_WIDTH):
+        """Bootstrap the state from every reading in the demand tensor."""
+        stats = cls(tensor.stations, bin_width)
+        n_days = tensor.values.shape[1]
+        first_hour = tensor.first_day.astype("datetime64[h]").astype(np.int64)
+
+        for start in range(0, len(tensor.stations), BLOCK_STATIONS):
+            block = np.asarray(tensor.values[start:start + BLOCK_STATIONS], dtype=np.float64)
+            flat = block.reshape(len(block), n_days * 24)
+            station, offset = np.nonzero(~np.isnan(flat))
+
+            stats._merge_rows(start + station, flat[station, offset], first_hour + offset)
+
+        return stats
+
+    # --------------------------------------------------
+    # Queries
+    # --------------------------------------------------
+    def std(self, station):
+        """Sample standard deviation (ddof=1)."""
+        i = self.index[station]
+        return float(np.sqrt(self.m2[i] / (self.count[i] - 1))) if self.count[i] > 1 else 0.0
+
+    def quantile(self, station, q):
+        """Approximate quantile(s) from the histogram sketch."""
+        counts = self.sketch[self.index[station]]
+        cumulative = np.cumsum(counts)
+        target = np.asarray(q, dtype=float) * cumulative[-1]
+
+        b = np.minimum(np.searchsorted(cumulative, target, side="left"), len(counts) - 1)
+        below = cumulative[b] - counts[b]
+        fraction = (target - below) / np.maximum(counts[b], 1)
+        return (b + np.clip(fraction, 0, 1)) * self.bin_width
+
+    def summary(self, station):
+        """None for a station without readings (e.g. only in the metadata)."""
+        i = self.index.get(station)
+        if i is None or not self.count[i]:
+            return None
+
+        mean = float(self.mean[i])
+        std = self.std(station)
+        return {
+            "count": int(self.count[i]),
+            "mean": mean,
+            "std": std,
+            "max": float(self.peak[i]),
+            "stability_score": 100 - (std / mean) * 100 if mean else 0.0
+        }
+
+    def risk_thresholds(self, station):
+        """
+        Output:
+        - dict: moderate (mean + std), high (running peak) and sketch p90 / p99,
+          or None for a station without readings
+        """
+        summary = self.summary(station)
+        if summary is None:
+            return None
+
+        p90, p99 = self.quantile(station, [0.9, 0.99])
+        return {
+            "moderate": summary["mean"] + summary["std"],
+            "high": summary["max"],
+            "p90": float(p90),
+            "p99": float(p99)
+        }
+
+    def hourly_profile(self, station):
+        """(mean, std) per hour of day."""
+        i = self.index[station]
+        n = self.hour_count[i]
+        return self.hour_mean[i], np.sqrt(self.hour_m2[i] / np.maximum(n - 1, 1))
+
+    def last_timestamp(self, station):
+        return np.datetime64(int(self.last_hour[self.index[station]]), "h")
+
+    # --------------------------------------------------
+    # Snapshot
+    # --------------------------------------------------
+    def save(self, path):
+        save_npz(
+            path,
+            stations=np.array(self.stations),
+            bin_width=np.float64(self.bin_width),
+            source_fingerprint=np.array(self.source_fingerprint or ""),
+            **{name: getattr(self, name) for name in ARRAYS}
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as stored:
+            return cls(
+                stored["stations"].tolist(),
+                float(stored["bin_width"]),
+                str(stored["source_fingerprint"]) or None,
+                **{name: stored[name] for name in ARRAYS}
+            )
+
+
+def load_online_stats(data_path=DATA_PATH, metadata_path=METADATA_PATH, path=None):
+    """
+    Snapshot for the current data file, rebuilt from the demand tensor when it
+    is missing or was taken against different data.
+
+    Input:
+    - path (str): snapshot file (default: snapshot_path(data_path))
+    """
+    path = path or snapshot_path(data_path)
+    fingerprint = source_fingerprint(data_path)
+
+    if os.path.exists(path):
+        stats = OnlineStats.load(path)
+        if stats.source_fingerprint == fingerprint:
+            return stats
+
+    stats = OnlineStats.from_tensor(open_tensor(data_path, metadata_path))
+    stats.source_fingerprint = fingerprint
+    stats.save(path)
+    return stats
@@ -0,0 +1,19 @@
+"""
+Default locations of the data and model artifacts, relative to the repo root.
+"""
+import os
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DATA_DIR = os.path.join(BASE_DIR, "data")
+DATA_PATH = os.path.join(DATA_DIR, "ev_charging_data.csv")
+METADATA_PATH = os.path.join(DATA_DIR, "station_metadata.csv")
+CACHE_DIR = os.path.join(DATA_DIR, "cache")
+LIVE_DIR = os.path.join(DATA_DIR, "live")
+RISK_SNAPSHOT_PATH = os.path.join(LIVE_DIR, "risk_snapshot.parquet")
+
+MODELS_DIR = os.path.join(BASE_DIR, "models")
+MODEL_PATH = os.path.join(MODELS_DIR, "ev_demand_model.pkl")
+
+# decision_engine.py/ is a folder, so it is loaded by file path (see decision.py)
+DECISION_ENGINE_PATH = os.path.join(BASE_DIR, "decision_engine.py", "decision_engine.py")
@@ -0,0 +1,162 @@
+"""
+Residual Statistics
+-------------------
+Computed once per trained model and stored next to the artifact as
+<model>_residuals.npz, so pages read confidence bands and diagnostics in
+constant time instead of re-predicting the whole history:
+
+- std and P10/P50/P90 of residuals per (station, hour of day), in-sample
+  over the full history
+- actual/predicted arrays of the hold-out split: the last 20% of hours,
+  across all stations (see features.time_split)
+
+Usage:
+    python -m ev_intelligence.residuals [--model PATH] [--data PATH]
+"""
+import argparse
+import os
+
+import joblib
+import numpy as np
+
+from ev_intelligence.atomic import save_npz
+from ev_intelligence.feature_store import load_features, source_fingerprint
+from ev_intelligence.features import design_matrix, time_split
+from ev_intelligence.forecasting import predict_matrix
+from ev_intelligence.paths import DATA_PATH, MODEL_PATH
+
+QUANTILES = np.array([0.1, 0.5, 0.9])
+
+
+def residual_stats_path(model_path):
+    return os.path.splitext(model_path)[0] + "_residuals.npz"
+
+
+def _grouped_quantiles(groups, values, n_groups, quantiles):
+    """Linear-interpolated quantiles of values per group (NaN for empty groups)."""
+    order = np.lexsort((values, groups))
+    ordered = values[order]
+
+    counts = np.bincount(groups, minlength=n_groups)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+
+    out = np.full((n_groups, len(quantiles)), np.nan)
+    filled = counts > 0
+
+    for k, q in enumerate(quantiles):
+        position = q * (counts[filled] - 1)
+        low = np.floor(position).astype(int)
+        high = np.minimum(low + 1, counts[filled] - 1)
+        frac = position - low
+
+        v_low = ordered[starts[filled] + low]
+        v_high = ordered[starts[filled] + high]
+        out[filled, k] = v_low + frac * (v_high - v_low)
+
+    return out
+
+
+def compute_residual_stats(model, features, feature_cols=None, test_fraction=0.2):
+    """
+    Input:
+    - model: fitted regressor
+    - features (DataFrame): output of build_features / load_features
+    - feature_cols (list): model feature order
+
+    Output:
+    - stats (dict of arrays)
+    """
+    if feature_cols is None:
+        feature_cols = model.feature_names_in_
+
+    actual = features["energy_kwh"].to_numpy(dtype=float)
+    predicted = predict_matrix(model, design_matrix(features, feature_cols))
+    residuals = actual - predicted
+
+    station_names, station_codes = np.unique(
+        features["station_id"].to_numpy(dtype=str), return_inverse=True
+    )
+    hours = features["hour"].to_numpy(dtype=int)
+
+    n_groups = len(station_names) * 24
+    groups = station_codes * 24 + hours
+
+    counts = np.bincount(groups, minlength=n_groups)
+    sums = np.bincount(groups, weights=residuals, minlength=n_groups)
+    squares = np.bincount(groups, weights=residuals ** 2, minlength=n_groups)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = sums / counts
+        std = np.sqrt(np.maximum(squares / counts - mean ** 2, 0))
+
+    quantiles = _grouped_quantiles(groups, residuals, n_groups, QUANTILES)
+
+    test = ~time_split(features, test_fraction)
+
+    return {
+        "station_names": station_names,
+        "hourly_std": std.reshape(-1, 24),
+        "hourly_quantiles": quantiles.reshape(-1, 24, len(QUANTILES)),
+        "quantile_levels": QUANTILES,
+        "overall_std": np.float64(residuals.std()),
+        "test_split": np.array("time"),
+        "test_actual": actual[test],
+        "test_pred": predicted[test]
+    }
+
+
+def save_residual_stats(stats, model_path):
+    """Write the sidecar next to model_path, tagged with the model's hash."""
+    path = residual_stats_path(model_path)
+    save_npz(path, model_fingerprint=source_fingerprint(model_path), **stats)
+    return path
+
+
+def load_residual_stats(model_path):
+    """
+    Stats for the model at model_path, or None if the sidecar is missing or
+    was computed for a different model file.
+    """
+    path = residual_stats_path(model_path)
+    if not os.path.exists(path):
+        return None
+
+    with np.load(path, allow_pickle=False) as sidecar:
+        stats = {name: sidecar[name] for name in sidecar.files}
+
+    if str(stats.pop("model_fingerprint")) != source_fingerprint(model_path):
+        return None
+
+    # Sidecars from before the time-based hold-out split are recomputed
+    if "test_split" not in stats:
+        return None
+
+    return stats
+
+
+def station_band(stats, station, hours):
+    """Residual std for a station at the given hours of day."""
+    matches = np.flatnonzero(stats["station_names"] == station)
+    if len(matches) == 0:
+        return np.full(len(hours), float(stats["overall_std"]))
+
+    band = stats["hourly_std"][matches[0], np.asarray(hours) % 24]
+    return np.where(np.isnan(band), float(stats["overall_std"]), band)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute residual statistics for a trained model.")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--data", default=DATA_PATH)
+    args = parser.parse_args()
+
+    model = joblib.load(args.model)
+    stats = compute_residual_stats(model, load_features(args.data))
+    path = save_residual_stats(stats, args.model)
+
+    print(f"Residual statistics saved at: {path}")
+    print(f"Overall residual std: {float(stats['overall_std']):.3f}")
+
+
+if __name__ == "__main__":
+    main()
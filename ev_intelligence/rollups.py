@@ -0,0 +1,312 @@
+"""
+Pre-aggregated Rollups
+----------------------
+Per-station aggregates behind Station_Overview and Historical_analytics,
+built once per data version from the demand tensor and updated
+incrementally when new readings arrive:
+
+- daily totals          sum / count per (station, day)
+- hourly profile        sum / count per (station, hour of day)
+- day-of-week profile   sum / count per (station, weekday)
+- histogram             counts per (station, fixed-width bin)
+- moments               count, sum, sum of squares, max per station
+
+Pages render from these small tables instead of re-aggregating raw rows.
+The live service carries them forward to each new data version with
+advance_rollups() and prunes the files of the version it superseded.
+"""
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+
+from ev_intelligence.atomic import save_npz
+from ev_intelligence.demand_tensor import open_tensor, tensor_paths
+from ev_intelligence.paths import CACHE_DIR, DATA_PATH, METADATA_PATH
+
+DAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+N_BINS = 30
+BLOCK_STATIONS = 256
+
+ARRAYS = [
+    "daily_sum", "daily_count",
+    "hourly_sum", "hourly_count",
+    "dow_sum", "dow_count",
+    "hist_counts",
+    "count", "total", "total_sq", "peak"
+]
+
+
+class Rollups:
+
+    def __init__(self, stations, first_day, bin_width, **arrays):
+        self.stations = list(stations)
+        self.index = {station: i for i, station in enumerate(self.stations)}
+        self.first_day = np.datetime64(first_day, "D")
+        self.bin_width = float(bin_width)
+
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+
+    # --------------------------------------------------
+    # Build & Update
+    # --------------------------------------------------
+    @classmethod
+    def from_tensor(cls, tensor, n_bins=N_BINS):
+        n_stations, n_days, _ = tensor.values.shape
+
+        peak_value = float(np.nanmax(tensor.values)) if tensor.values.size else 1.0
+        bin_width = max(peak_value, 1e-9) / n_bins
+
+        arrays = {
+            "daily_sum": np.zeros((n_stations, n_days)),
+            "daily_count": np.zeros((n_stations, n_days), dtype=np.int64),
+            "hourly_sum": np.zeros((n_stations, 24)),
+            "hourly_count": np.zeros((n_stations, 24), dtype=np.int64),
+            "dow_sum": np.zeros((n_stations, 7)),
+            "dow_count": np.zeros((n_stations, 7), dtype=np.int64),
+            "hist_counts": np.zeros((n_stations, n_bins), dtype=np.int64),
+            "count": np.zeros(n_stations, dtype=np.int64),
+            "total": np.zeros(n_stations),
+            "total_sq": np.zeros(n_stations),
+            "peak": np.full(n_stations, np.nan)
+        }
+
+        day_of_week = (tensor.dates.astype(np.int64) + 3) % 7  # 1970-01-01 was a Thursday
+
+        for start in range(0, n_stations, BLOCK_STATIONS):
+            block = np.asarray(tensor.values[start:start + BLOCK_STATIONS], dtype=np.float64)
+            rows = slice(start, start + len(block))
+
+            valid = ~np.isnan(block)
+            filled = np.where(valid, block, 0.0)
+
+            arrays["daily_sum"][rows] = filled.sum(axis=2)
+            arrays["daily_count"][rows] = valid.sum(axis=2)
+            arrays["hourly_sum"][rows] = filled.sum(axis=1)
+            arrays["hourly_count"][rows] = valid.sum(axis=1)
+
+            for dow in range(7):
+                on_day = day_of_week == dow
+                arrays["dow_sum"][rows, dow] = arrays["daily_sum"][rows][:, on_day].sum(axis=1)
+                arrays["dow_count"][rows, dow] = arrays["daily_count"][rows][:, on_day].sum(axis=1)
+
+            arrays["count"][rows] = valid.sum(axis=(1, 2))
+            arrays["total"][rows] = filled.sum(axis=(1, 2))
+            arrays["total_sq"][rows] = (filled ** 2).sum(axis=(1, 2))
+            arrays["peak"][rows] = np.where(valid, block, -np.inf).max(axis=(1, 2))
+
+            station_of = np.broadcast_to(np.arange(len(block))[:, None, None], block.shape)[valid]
+            bins = np.minimum((block[valid] / bin_width).astype(np.int64), n_bins - 1)
+            arrays["hist_counts"][rows] = np.bincount(
+                station_of * n_bins + bins, minlength=len(block) * n_bins
+            ).reshape(len(block), n_bins)
+
+        arrays["peak"][arrays["count"] == 0] = np.nan
+
+        return cls(tensor.stations, tensor.first_day, bin_width, **arrays)
+
+    def _grow(self, n_stations, n_days, n_bins):
+        """Pad arrays for new stations, later days or higher bins."""
+        def pad(array, shape, fill=0):
+            if array.shape == shape:
+                return array
+            grown = np.full(shape, fill, dtype=array.dtype)
+            grown[tuple(slice(0, n) for n in array.shape)] = array
+            return grown
+
+        self.daily_sum = pad(self.daily_sum, (n_stations, n_days))
+        self.daily_count = pad(self.daily_count, (n_stations, n_days))
+        self.hourly_sum = pad(self.hourly_sum, (n_stations, 24))
+        self.hourly_count = pad(self.hourly_count, (n_stations, 24))
+        self.dow_sum = pad(self.dow_sum, (n_stations, 7))
+        self.dow_count = pad(self.dow_count, (n_stations, 7))
+        self.hist_counts = pad(self.hist_counts, (n_stations, n_bins))
+        self.count = pad(self.count, (n_stations,))
+        self.total = pad(self.total, (n_stations,))
+        self.total_sq = pad(self.total_sq, (n_stations,))
+        self.peak = pad(self.peak, (n_stations,), np.nan)
+
+    def update(self, readings):
+        """
+        Fold new readings (station_id, datetime, energy_kwh) into every
+        aggregate without touching the rest of the history. The readings
+        must not be in the rollups yet; repeated station-hours within the
+        batch count once (the last one wins).
+
+        Raises ValueError for readings dated before first_day, which the
+        day axis cannot hold; the rollups are left unchanged.
+        """
+        readings = readings.assign(
+            station_id=readings["station_id"].astype(str),
+            datetime=pd.to_datetime(readings["datetime"]).dt.floor("h")
+        ).drop_duplicates(["station_id", "datetime"], keep="last")
+
+        if not len(readings):
+            return
+
+        timestamp = readings["datetime"].to_numpy().astype("datetime64[h]")
+        day = (timestamp.astype("datetime64[D]") - self.first_day).astype(np.int64)
+
+        # A negative day would silently index from the end of the array
+        if day.min() < 0:
+            raise ValueError(f"Readings before {self.first_day} are outside the rollups")
+
+        for station in pd.unique(readings["station_id"]):
+            if station not in self.index:
+                self.index[station] = len(self.stations)
+                self.stations.append(station)
+
+        station = readings["station_id"].map(self.index).to_numpy()
+        value = readings["energy_kwh"].to_numpy(dtype=float)
+
+        hour = timestamp.astype(np.int64) % 24
+        dow = (timestamp.astype("datetime64[D]").astype(np.int64) + 3) % 7
+        bins = np.maximum((value / self.bin_width).astype(np.int64), 0)
+
+        self._grow(
+            len(self.stations),
+            max(self.daily_sum.shape[1], int(day.max()) + 1),
+            max(self.hist_counts.shape[1], int(bins.max()) + 1)
+        )
+
+        np.add.at(self.daily_sum, (station, day), value)
+        np.add.at(self.daily_count, (station, day), 1)
+        np.add.at(self.hourly_sum, (station, hour), value)
+        np.add.at(self.hourly_count, (station, hour), 1)
+        np.add.at(self.dow_sum, (station, dow), value)
+        np.add.at(self.dow_count, (station, dow), 1)
+        np.add.at(self.hist_counts, (station, bins), 1)
+        np.add.at(self.count, station, 1)
+        np.add.at(self.total, station, value)
+        np.add.at(self.total_sq, station, value ** 2)
+        np.fmax.at(self.peak, station, value)
+
+    # --------------------------------------------------
+    # Persistence
+    # --------------------------------------------------
+    def save(self, path):
+        save_npz(
+            path,
+            stations=np.array(self.stations),
+            first_day=np.array(self.first_day),
+            bin_width=np.float64(self.bin_width),
+            **{name: getattr(self, name) for name in ARRAYS}
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as stored:
+            return cls(
+                stored["stations"].tolist(),
+                stored["first_day"],
+                stored["bin_width"],
+                **{name: stored[name] for name in ARRAYS}
+            )
+
+    # --------------------------------------------------
+    # Page Tables
+    # --------------------------------------------------
+    def summary(self, station):
+        """count, mean, std (sample) and max of a station's demand."""
+        i = self.index[station]
+        n = self.count[i]
+        mean = self.total[i] / n
+        variance = (self.total_sq[i] - n * mean ** 2) / (n - 1) if n > 1 else 0.0
+
+        return {
+            "count": int(n),
+            "mean": float(mean),
+            "std": float(np.sqrt(max(variance, 0.0))),
+            "max": float(self.peak[i])
+        }
+
+    def daily_totals(self, station):
+        i = self.index[station]
+        days = np.flatnonzero(self.daily_count[i])
+        return pd.DataFrame({
+            "date": self.first_day + days,
+            "energy_kwh": self.daily_sum[i, days]
+        })
+
+    def hourly_profile(self, station):
+        i = self.index[station]
+        return pd.DataFrame({
+            "hour": np.arange(24),
+            "energy_kwh": self.hourly_sum[i] / np.maximum(self.hourly_count[i], 1)
+        })
+
+    def day_of_week_profile(self, station):
+        i = self.index[station]
+        return pd.DataFrame({
+            "day_of_week": DAY_NAMES,
+            "energy_kwh": self.dow_sum[i] / np.maximum(self.dow_count[i], 1)
+        })
+
+    def histogram(self, station):
+        i = self.index[station]
+        edges = np.arange(self.hist_counts.shape[1] + 1) * self.bin_width
+        return pd.DataFrame({
+            "bin_start": edges[:-1],
+            "bin_end": edges[1:],
+            "bin_center": (edges[:-1] + edges[1:]) / 2,
+            "count": self.hist_counts[i]
+        })
+
+
+def rollup_path(data_path=DATA_PATH, metadata_path=METADATA_PATH, cache_dir=CACHE_DIR):
+    values_path, _ = tensor_paths(data_path, metadata_path, cache_dir)
+    return values_path.replace("demand_", "rollups_").replace(".npy", ".npz")
+
+
+def load_rollups(data_path=DATA_PATH, metadata_path=METADATA_PATH, cache_dir=CACHE_DIR):
+    """Rollups for the current data version, built from the tensor if missing."""
+    path = rollup_path(data_path, metadata_path, cache_dir)
+
+    if os.path.exists(path):
+        return Rollups.load(path)
+
+    rollups = Rollups.from_tensor(open_tensor(data_path, metadata_path, cache_dir))
+    rollups.save(path)
+    return rollups
+
+
+def advance_rollups(readings, previous_path, path):
+    """
+    Write the rollups of a new data version as those of the previous
+    version plus the readings appended in between.
+
+    Input:
+    - readings (DataFrame): date, hour, station_id, energy_kwh
+    - previous_path, path (str): rollup_path before and after the append
+
+    Output:
+    - bool: False when there was nothing to carry forward or the readings
+      do not fit; load_rollups then rebuilds from the tensor
+    """
+    if not os.path.exists(previous_path):
+        return False
+
+    rollups = Rollups.load(previous_path)
+    try:
+        rollups.update(readings.assign(
+            datetime=pd.to_datetime(readings["date"]) + pd.to_timedelta(readings["hour"].astype(int), unit="h")
+        ))
+    except ValueError:
+        return False
+
+    rollups.save(path)
+    return True
+
+
+def prune_version(fingerprint, cache_dir=CACHE_DIR):
+    """Delete the demand tensor, rollups and feature store of a superseded data version."""
+    patterns = [f"demand_{fingerprint}_*", f"rollups_{fingerprint}_*", f"features_{fingerprint}*.npz"]
+
+    for pattern in patterns:
+        for path in glob.glob(os.path.join(cache_dir, pattern)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
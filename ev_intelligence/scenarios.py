@@ -0,0 +1,306 @@
+"""
+Monte Carlo Scenario Simulator
+------------------------------
+Capacity planning needs distributions, not a single growth multiplier.
+Every station is simulated along many sampled paths, each combining:
+
+- growth   adoption level for the whole horizon, Normal(mean, sd) percent
+- stress   day-level multiplier (events, outages elsewhere), log-normal
+           around 1, redrawn at every midnight
+- weather  hourly multiplicative shock following an AR(1) process, so hot
+           or cold spells persist for several hours
+
+The baseline follows the recursive forecaster; path p is evaluated by tree
+p mod n_trees of the forest, so model uncertainty is part of the spread.
+Scenario multipliers scale the output of each step and the scaled demand is
+fed back as the next step's lags, so growth and persistent shocks compound
+through the recursion as in the fleet forecast.
+
+All paths of a batch of stations are one (stations x paths) FeatureState
+and every horizon step is a single vectorized evaluation. Fleet runs split
+stations into chunks that run in a process pool.
+
+Per station and hour the simulator reports demand quantiles and the
+probability of reaching the decision engine's MEDIUM / HIGH utilization
+thresholds and of exceeding the station's historical peak.
+
+Usage:
+    python -m ev_intelligence.scenarios --paths 1000 --horizon 24 --growth-mean 10 --growth-sd 5
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from ev_intelligence.decision import HIGH_RISK_THRESHOLD, MEDIUM_RISK_THRESHOLD
+from ev_intelligence.demand_tensor import open_tensor
+from ev_intelligence.fast_forest import flattened
+from ev_intelligence.feature_state import FeatureState
+from ev_intelligence.forecasting import QUANTILES, predict_matrix
+from ev_intelligence.model_registry import current_model_path, load_model
+from ev_intelligence.online_stats import load_online_stats
+from ev_intelligence.paths import DATA_DIR, DATA_PATH, METADATA_PATH
+from ev_intelligence.tables import check_output_path, write_table
+
+DEFAULT_OUTPUT = os.path.join(DATA_DIR, "forecasts", "scenarios.parquet")
+
+DEFAULT_SCENARIO = {
+    "growth_mean": 0.0,      # percent
+    "growth_sd": 5.0,        # percent
+    "stress_sigma": 0.10,    # log-normal sigma of the daily multiplier
+    "weather_sigma": 0.05,   # stationary sigma of the hourly log shock
+    "weather_rho": 0.8       # hour-to-hour persistence of the shock
+}
+
+# Rows (stations x paths) simulated together in one FeatureState
+ROW_BUDGET = 16_384
+
+# Per-process state, filled by _init_worker
+_worker = {}
+
+
+def sample_multipliers(first_hour, horizon, scenario=None, rng=None):
+    """
+    Input:
+    - first_hour (array): absolute hour index (hours since epoch) of the
+      first forecast hour of every path
+    - horizon (int): hours ahead
+    - scenario (dict): overrides of DEFAULT_SCENARIO
+
+    Output:
+    - multipliers (ndarray): (n_paths x horizon) growth * stress * weather
+    """
+    scenario = {**DEFAULT_SCENARIO, **(scenario or {})}
+    rng = rng or np.random.default_rng()
+    first_hour = np.asarray(first_hour, dtype=np.int64)
+    n_paths = len(first_hour)
+
+    growth = 1 + rng.normal(scenario["growth_mean"], scenario["growth_sd"], (n_paths, 1)) / 100
+
+    # One stress draw per calendar day touched by the horizon
+    day_index = (first_hour[:, None] + np.arange(horizon)) // 24 - first_hour[:, None] // 24
+    sigma = scenario["stress_sigma"]
+    stress = rng.lognormal(-sigma ** 2 / 2, sigma, (n_paths, int(day_index.max()) + 1))
+    stress = np.take_along_axis(stress, day_index, axis=1)
+
+    # AR(1) log shock started from its stationary distribution
+    rho, sigma = scenario["weather_rho"], scenario["weather_sigma"]
+    shock = np.empty((n_paths, horizon))
+    shock[:, 0] = rng.standard_normal(n_paths) * sigma
+    innovations = rng.standard_normal((n_paths, horizon)) * sigma * np.sqrt(1 - rho ** 2)
+    for step in range(1, horizon):
+        shock[:, step] = rho * shock[:, step - 1] + innovations[:, step]
+    weather = np.exp(shock - sigma ** 2 / 2)
+
+    return np.maximum(growth, 0) * stress * weather
+
+
+def simulate(model, state, horizon, capacity, peak=None, n_paths=1000, scenario=None, seed=None):
+    """
+    Monte Carlo demand paths for every series of state.
+
+    Input:
+    - model: fitted regressor (a forest spreads paths over its trees)
+    - state (FeatureState): rolling features of every series (not advanced)
+    - capacity (array): station capacity per series
+    - peak (array): historical peak per series (optional)
+    - n_paths (int): sampled paths per series
+
+    Output:
+    - result (dict of arrays, (n_series x horizon) unless noted):
+      quantiles (n_series x 3 x horizon) of demand at P10/P50/P90,
+      p_medium, p_high (utilization at or above the decision thresholds),
+      p_over_peak (demand above the historical peak; NaN without peak)
+    """
+    rng = np.random.default_rng(seed)
+    n_series = len(state)
+
+    flat = flattened(model)
+    paths = state.repeat(n_paths)
+    trees = None if flat is None else np.tile(np.arange(n_paths) % flat.n_trees, n_series)
+
+    multipliers = sample_multipliers(paths.hours + 1, horizon, scenario, rng)
+
+    demand = np.empty((n_series * n_paths, horizon))
+
+    for step in range(horizon):
+        if trees is not None:
+            baseline = flat.predict_paths(paths.matrix(), trees)
+        else:
+            baseline = predict_matrix(model, paths.matrix())
+        demand[:, step] = baseline * multipliers[:, step]
+        paths.push(demand[:, step])
+
+    demand = demand.reshape(n_series, n_paths, horizon)
+    capacity = np.asarray(capacity, dtype=float)[:, None, None]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        utilization = demand / capacity
+
+    result = {
+        "quantiles": np.moveaxis(np.quantile(demand, QUANTILES, axis=1), 0, 1),
+        "p_medium": (utilization >= MEDIUM_RISK_THRESHOLD).mean(axis=1),
+        "p_high": (utilization >= HIGH_RISK_THRESHOLD).mean(axis=1),
+        "p_over_peak": np.full((n_series, horizon), np.nan)
+    }
+    if peak is not None:
+        result["p_over_peak"] = (demand > np.asarray(peak, dtype=float)[:, None, None]).mean(axis=1)
+
+    return result
+
+
+def scenario_table(station_ids, first_hour, result, capacity):
+    """Long table: one row per station-hour."""
+    n_series, horizon = result["p_high"].shape
+    hours = np.asarray(first_hour)[:, None] + np.arange(horizon)
+
+    return pd.DataFrame({
+        "station_id": np.repeat(station_ids, horizon),
+        "hour_ahead": np.tile(np.arange(1, horizon + 1), n_series),
+        "timestamp": hours.ravel().astype("datetime64[h]").astype("datetime64[ns]"),
+        "demand_p10": result["quantiles"][:, 0].ravel(),
+        "demand_p50": result["quantiles"][:, 1].ravel(),
+        "demand_p90": result["quantiles"][:, 2].ravel(),
+        "capacity_kw": np.repeat(capacity, horizon),
+        "p_medium": result["p_medium"].ravel(),
+        "p_high": result["p_high"].ravel(),
+        "p_over_peak": result["p_over_peak"].ravel()
+    })
+
+
+# --------------------------------------------------
+# Fleet Runs
+# --------------------------------------------------
+def _init_worker(model_path, data_path, metadata_path):
+    _worker["model"] = load_model(model_path, data_path)
+    _worker["tensor"] = open_tensor(data_path, metadata_path)
+    _worker["online_stats"] = load_online_stats(data_path, metadata_path)
+
+
+def _simulate_chunk(stations, capacities, horizon, n_paths, scenario, seed):
+    model = _worker["model"]
+    online_stats = _worker["online_stats"]
+
+    state = FeatureState.from_tensor(_worker["tensor"], model.feature_names_in_, list(stations))
+    capacity = pd.Series(capacities, index=stations).loc[state.station_ids].to_numpy(dtype=float)
+    thresholds = [online_stats.risk_thresholds(s) for s in state.station_ids]
+    peak = np.array([np.nan if t is None else t["high"] for t in thresholds])
+
+    result = simulate(model, state, horizon, capacity, peak, n_paths, scenario, seed)
+    return scenario_table(state.station_ids, state.hours + 1, result, capacity)
+
+
+def simulate_fleet(
+    metadata,
+    horizon=24,
+    n_paths=1000,
+    scenario=None,
+    workers=1,
+    seed=0,
+    model_path=None,
+    data_path=DATA_PATH,
+    metadata_path=METADATA_PATH
+):
+    """
+    Input:
+    - metadata (DataFrame): station_id and capacity_kw per station
+    - n_paths (int): sampled paths per station
+    - scenario (dict): overrides of DEFAULT_SCENARIO
+    - workers (int): processes; 1 runs in the current process
+
+    Output:
+    - scenarios (DataFrame): one row per station-hour
+    """
+    model_path = model_path or current_model_path()
+
+    stations = metadata["station_id"].to_numpy()
+    capacities = metadata["capacity_kw"].to_numpy()
+
+    chunk_size = max(1, ROW_BUDGET // n_paths)
+    starts = range(0, len(stations), chunk_size)
+    chunks = [
+        # Independent, reproducible streams per chunk
+        (stations[i:i + chunk_size], capacities[i:i + chunk_size], horizon, n_paths, scenario, (seed, k))
+        for k, i in enumerate(starts)
+    ]
+
+    if workers <= 1:
+        _init_worker(model_path, data_path, metadata_path)
+        parts = [_simulate_chunk(*chunk) for chunk in chunks]
+    else:
+        # Write the model sidecars, tensor and statistics snapshot once so
+        # workers only map them
+        load_model(model_path, data_path)
+        load_online_stats(data_path, metadata_path)
+
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(model_path, data_path, metadata_path)
+        ) as pool:
+            parts = list(pool.map(_simulate_chunk, *zip(*chunks)))
+
+    return pd.concat(parts, ignore_index=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Monte Carlo growth / stress / weather scenarios for every station.")
+    parser.add_argument("--paths", type=int, default=1000, help="sampled paths per station")
+    parser.add_argument("--horizon", type=int, default=24, help="hours ahead")
+    parser.add_argument("--growth-mean", type=float, default=DEFAULT_SCENARIO["growth_mean"], help="percent")
+    parser.add_argument("--growth-sd", type=float, default=DEFAULT_SCENARIO["growth_sd"], help="percent")
+    parser.add_argument("--stress-sigma", type=float, default=DEFAULT_SCENARIO["stress_sigma"])
+    parser.add_argument("--weather-sigma", type=float, default=DEFAULT_SCENARIO["weather_sigma"])
+    parser.add_argument("--weather-rho", type=float, default=DEFAULT_SCENARIO["weather_rho"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help=".parquet or .csv")
+    parser.add_argument("--model", default=None, help="model file (default: registry's current version)")
+    parser.add_argument("--data", default=DATA_PATH)
+    parser.add_argument("--metadata", default=METADATA_PATH)
+    args = parser.parse_args()
+
+    try:
+        check_output_path(args.output)
+    except ValueError as error:
+        parser.error(str(error))
+
+    scenario = {
+        "growth_mean": args.growth_mean,
+        "growth_sd": args.growth_sd,
+        "stress_sigma": args.stress_sigma,
+        "weather_sigma": args.weather_sigma,
+        "weather_rho": args.weather_rho
+    }
+
+    start = time.perf_counter()
+    table = simulate_fleet(
+        pd.read_csv(args.metadata),
+        horizon=args.horizon,
+        n_paths=args.paths,
+        scenario=scenario,
+        workers=args.workers,
+        seed=args.seed,
+        model_path=args.model,
+        data_path=args.data,
+        metadata_path=args.metadata
+    )
+    elapsed = time.perf_counter() - start
+
+    write_table(table, args.output)
+
+    n_stations = table["station_id"].nunique()
+    path_hours = n_stations * args.paths * args.horizon
+    print(f"Simulated {n_stations} stations x {args.paths} paths x {args.horizon}h in {elapsed:.2f}s "
+          f"({path_hours / elapsed:,.0f} path-hours/sec)")
+
+    worst = table.groupby("station_id", observed=True)[["p_high", "p_over_peak"]].max()
+    print(worst.sort_values("p_over_peak", ascending=False).head(10).to_string(float_format=lambda v: f"{v:.3f}"))
+    print(f"Saved at: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
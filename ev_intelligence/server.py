@@ -0,0 +1,434 @@
+"""
+Forecast Prediction Server
+--------------------------
+Lightweight HTTP/JSON API over the warm model, so dashboards and external
+schedulers share one process instead of each loading their own:
+
+- GET|POST /forecast   station, horizon, growth -> demand with confidence band
+- GET|POST /decision   predicted_demand + station_capacity, or a station to
+                       forecast -> decision_engine() output
+- GET      /metrics    request latency p50/p99, micro-batch sizes, cache stats
+- GET      /health
+
+Forecast requests that miss the forecast cache are micro-batched: requests
+arriving within a small window are stacked into one FeatureState, so each
+horizon step is a single predict call for the whole batch.
+
+Without --model the server follows the model registry: every request
+resolves the current version, so promoting a version swaps the model in
+flight. Requests already batched finish on the version they started with.
+
+Usage:
+    python -m ev_intelligence.server --port 8000 --window-ms 5
+    curl "localhost:8000/forecast?station=Station_3&horizon=24&growth=10"
+"""
+import argparse
+import json
+import math
+import queue
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from ev_intelligence.cache import (
+    fingerprint,
+    get_demand_tensor,
+    get_metadata,
+    get_model,
+    get_residual_stats
+)
+from ev_intelligence.decision import decision_engine, decision_engine_batch
+from ev_intelligence.feature_state import WINDOW, FeatureState
+from ev_intelligence.forecast_cache import forecast_cache
+from ev_intelligence.forecasting import recursive_forecast
+from ev_intelligence.model_registry import current_model_path
+from ev_intelligence.paths import DATA_PATH, METADATA_PATH
+from ev_intelligence.residuals import station_band
+
+MAX_HORIZON = 168
+DEFAULT_HORIZON = 24
+
+
+class NotFound(Exception):
+    pass
+
+
+def _percentiles(values, scale=1.0, digits=2):
+    if not values:
+        return {"p50": None, "p99": None}
+    p50, p99 = np.percentile(np.array(values) * scale, [50, 99])
+    return {"p50": round(float(p50), digits), "p99": round(float(p99), digits)}
+
+
+def _json_safe(value):
+    """Replace NaN and infinities, which are not valid JSON, with None."""
+    if isinstance(value, dict):
+        return {key: _json_safe(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_safe(item) for item in value]
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+# --------------------------------------------------
+# Micro-batching
+# --------------------------------------------------
+class MicroBatcher:
+    """
+    Collects submitted items for up to `window` seconds (or `max_batch`
+    items) and hands them to run_batch(items) -> results on one worker
+    thread.
+    """
+
+    def __init__(self, run_batch, window=0.005, max_batch=256):
+        self.run_batch = run_batch
+        self.window = window
+        self.max_batch = max_batch
+
+        self._queue = queue.Queue()
+        self.batch_sizes = deque(maxlen=10_000)
+
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        future = Future()
+        self._queue.put((item, future))
+        return future.result()
+
+    def _loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self.batch_sizes.append(len(batch))
+            items = [item for item, _ in batch]
+
+            try:
+                results = self.run_batch(items)
+            except Exception as error:
+                for _, future in batch:
+                    future.set_exception(error)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+
+# --------------------------------------------------
+# Service
+# --------------------------------------------------
+class PredictionService:
+
+    def __init__(
+        self,
+        model_path=None,
+        data_path=DATA_PATH,
+        metadata_path=METADATA_PATH,
+        window=0.005,
+        max_batch=256
+    ):
+        self.model_path = model_path
+        self.data_path = data_path
+        self.metadata_path = metadata_path
+
+        self.batcher = MicroBatcher(self._forecast_batch, window, max_batch)
+
+        self._lock = threading.Lock()
+        self.requests = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.latencies = defaultdict(lambda: deque(maxlen=10_000))
+        self.predict_calls = 0
+
+        # Warm the model, tensor and residual statistics before serving
+        get_model(self.current_model_path(), data_path)
+        get_demand_tensor(data_path, metadata_path)
+        get_residual_stats(self.current_model_path(), data_path)
+
+    def current_model_path(self):
+        """The fixed --model, or the registry's current version."""
+        return self.model_path or current_model_path()
+
+    def record(self, endpoint, seconds, failed=False):
+        with self._lock:
+            self.requests[endpoint] += 1
+            self.latencies[endpoint].append(seconds)
+            if failed:
+                self.errors[endpoint] += 1
+
+    # --------------------------------------------------
+    # Forecast
+    # --------------------------------------------------
+    def _forecast_batch(self, items):
+        """
+        Recursive forecasts for a batch of (model_path, station, horizon,
+        growth) items: one FeatureState per model version in the batch.
+        """
+        tensor = get_demand_tensor(self.data_path, self.metadata_path)
+        results = [None] * len(items)
+
+        for model_path in dict.fromkeys(path for path, _, _, _ in items):
+            rows = [i for i, item in enumerate(items) if item[0] == model_path]
+            model = get_model(model_path, self.data_path)
+
+            stations = [items[i][1] for i in rows]
+            horizon = max(items[i][2] for i in rows)
+            growth = np.array([items[i][3] for i in rows], dtype=float)
+
+            state = FeatureState.from_tensor(tensor, model.feature_names_in_, stations)
+            forecasts = recursive_forecast(model, state, horizon, growth_factor=growth)
+
+            for i, values in zip(rows, forecasts):
+                results[i] = values
+
+            with self._lock:
+                self.predict_calls += horizon
+
+        return results
+
+    def forecast(self, station, horizon=DEFAULT_HORIZON, growth=0.0):
+        horizon = int(horizon)
+        growth = float(growth)
+        if not 1 <= horizon <= MAX_HORIZON:
+            raise ValueError(f"horizon must be between 1 and {MAX_HORIZON}")
+        if not math.isfinite(growth):
+            raise ValueError("growth must be a finite number")
+
+        tensor = get_demand_tensor(self.data_path, self.metadata_path)
+        i = tensor.index.get(station)
+        if i is None or tensor.last_index[i] < WINDOW - 1:
+            raise NotFound(f"No recent history for station '{station}'")
+
+        model_path = self.current_model_path()
+        model = get_model(model_path, self.data_path)
+
+        key = forecast_cache.key(
+            station,
+            growth,
+            model.version,
+            fingerprint(self.data_path)
+        )
+
+        values = forecast_cache.get(key, horizon)
+        cached = values is not None
+
+        if not cached:
+            values = self.batcher.submit((model_path, station, horizon, growth))
+            forecast_cache.put(key, values)
+            values = values[:horizon]
+
+        last_reading = tensor.first_day.astype("datetime64[h]") + int(tensor.last_index[i])
+        hours = last_reading.astype(np.int64) + np.arange(1, horizon + 1)
+        band = station_band(get_residual_stats(model_path, self.data_path), station, hours)
+
+        return {
+            "station": station,
+            "model_version": model.version,
+            "horizon": horizon,
+            "growth_factor": growth,
+            "start": str(last_reading + 1),
+            "forecast": np.round(values, 3).tolist(),
+            "lower": np.round(values - band, 3).tolist(),
+            "upper": np.round(values + band, 3).tolist(),
+            "cached": cached
+        }
+
+    # --------------------------------------------------
+    # Decision
+    # --------------------------------------------------
+    def decision(self, params):
+        """
+        Either explicit predicted_demand / station_capacity (scalars or lists),
+        or a station whose forecast peak is checked against its capacity.
+        """
+        if "predicted_demand" in params:
+            demand = params["predicted_demand"]
+            capacity = params.get("station_capacity")
+            if capacity is None:
+                raise ValueError("station_capacity is required with predicted_demand")
+
+            capacities = np.asarray(capacity, dtype=float)
+            if not (np.isfinite(capacities) & (capacities > 0)).all():
+                raise ValueError("station_capacity must be a positive number")
+
+            if np.ndim(demand) == 0 and np.ndim(capacity) == 0:
+                return decision_engine(float(demand), float(capacity))
+
+            decisions = decision_engine_batch(demand, capacity)
+            return {"decisions": decisions.astype({"risk_level": str, "action": str}).to_dict("records")}
+
+        if "station" not in params:
+            raise ValueError("Pass predicted_demand and station_capacity, or a station")
+
+        station = params["station"]
+        metadata = get_metadata(self.metadata_path)
+        info = metadata[metadata["station_id"] == station]
+        if info.empty:
+            raise NotFound(f"No metadata for station '{station}'")
+
+        forecast = self.forecast(
+            station,
+            params.get("horizon", DEFAULT_HORIZON),
+            params.get("growth", 0.0)
+        )
+        peak = max(forecast["forecast"])
+
+        decision = decision_engine(peak, float(info["capacity_kw"].iloc[0]))
+        decision["station"] = station
+        decision["peak_hour_ahead"] = int(np.argmax(forecast["forecast"])) + 1
+        return decision
+
+    # --------------------------------------------------
+    # Metrics
+    # --------------------------------------------------
+    def metrics(self):
+        with self._lock:
+            endpoints = {
+                endpoint: {
+                    "requests": self.requests[endpoint],
+                    "errors": self.errors[endpoint],
+                    "latency_ms": _percentiles(list(self.latencies[endpoint]), 1000)
+                }
+                for endpoint in sorted(self.requests)
+            }
+            predict_calls = self.predict_calls
+
+        sizes = list(self.batcher.batch_sizes)
+        return {
+            "endpoints": endpoints,
+            "batches": {
+                "count": len(sizes),
+                "mean_size": round(float(np.mean(sizes)), 2) if sizes else None,
+                "max_size": max(sizes) if sizes else None,
+                "size": _percentiles(sizes, digits=1)
+            },
+            "predict_calls": predict_calls,
+            "model_version": get_model(self.current_model_path(), self.data_path).version,
+            "forecast_cache": forecast_cache.stats()
+        }
+
+
+# --------------------------------------------------
+# HTTP
+# --------------------------------------------------
+def make_handler(service, verbose=False):
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def _params(self):
+            url = urlparse(self.path)
+            params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+            length = int(self.headers.get("Content-Length") or 0)
+            if length:
+                params.update(json.loads(self.rfile.read(length)))
+            return url.path.rstrip("/"), params
+
+        def _send(self, status, body):
+            payload = json.dumps(_json_safe(body), allow_nan=False).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _dispatch(self):
+            started = time.perf_counter()
+            status, path = 200, None
+
+            try:
+                path, params = self._params()
+
+                if path == "/forecast":
+                    if "station" not in params:
+                        raise ValueError("station is required")
+                    body = service.forecast(
+                        params["station"],
+                        params.get("horizon", DEFAULT_HORIZON),
+                        params.get("growth", 0.0)
+                    )
+                elif path == "/decision":
+                    body = service.decision(params)
+                elif path == "/metrics":
+                    body = service.metrics()
+                elif path == "/health":
+                    body = {"status": "ok"}
+                else:
+                    raise NotFound(f"Unknown endpoint '{path}'")
+
+            except NotFound as error:
+                status, body = 404, {"error": str(error)}
+            except (ValueError, TypeError, json.JSONDecodeError) as error:
+                status, body = 400, {"error": str(error)}
+            except Exception as error:
+                status, body = 500, {"error": f"{type(error).__name__}: {error}"}
+
+            self._send(status, body)
+
+            if path in ("/forecast", "/decision"):
+                service.record(path, time.perf_counter() - started, failed=status != 200)
+
+        do_GET = _dispatch
+        do_POST = _dispatch
+
+        def log_message(self, format, *args):
+            if verbose:
+                super().log_message(format, *args)
+
+    return Handler
+
+
+def make_server(service, host="127.0.0.1", port=8000, verbose=False):
+    server = ThreadingHTTPServer((host, port), make_handler(service, verbose))
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve EV demand forecasts and decisions over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--window-ms", type=float, default=5.0, help="micro-batch collection window")
+    parser.add_argument("--max-batch", type=int, default=256)
+    parser.add_argument("--model", default=None, help="serve this model file instead of the registry's current version")
+    parser.add_argument("--data", default=DATA_PATH)
+    parser.add_argument("--metadata", default=METADATA_PATH)
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args()
+
+    service = PredictionService(
+        args.model,
+        args.data,
+        args.metadata,
+        window=args.window_ms / 1000,
+        max_batch=args.max_batch
+    )
+    server = make_server(service, args.host, args.port, args.verbose)
+
+    print(f"Serving forecasts on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(service.metrics(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Spatial Grid Index
+------------------
+Thousands of station markers make the Grid Risk Map slow to build and heavy
+to ship to the browser. Stations are bucketed into a square Web Mercator
+grid whose cells shrink with the map zoom (CELL_PX screen pixels wide at
+every zoom), and only the cells inside the current view are sent, one
+marker per cell carrying its aggregates:
+
+- count          stations in the cell
+- utilization    worst (max) utilization, which also gives the worst risk
+- peak_forecast  total forecast peak demand
+- station        worst station of the cell (the station itself once zoomed in)
+
+Per zoom level, stations are sorted once by cell id (column-major, so one
+column of cells is a contiguous block); culling the view is a binary search
+over those blocks, and aggregating is one reduceat per statistic over the
+stations of the visible cells only.
+
+Viewports crossing the antimeridian are not supported.
+"""
+import numpy as np
+import pandas as pd
+
+# Mapbox GL renders the world 512 px wide at zoom 0
+TILE_PX = 512
+
+# On-screen width of one grid cell
+CELL_PX = 48
+
+MAX_ZOOM = 18
+
+# Closest zoom fit_view picks, so a single station keeps its surroundings
+FIT_MAX_ZOOM = 15
+
+# Web Mercator is undefined at the poles
+MAX_LATITUDE = 85.0511
+
+
+def mercator(latitude, longitude):
+    """(x, y) in [0, 1], origin at the north-west corner."""
+    lat = np.radians(np.clip(np.asarray(latitude, dtype=float), -MAX_LATITUDE, MAX_LATITUDE))
+    x = (np.asarray(longitude, dtype=float) + 180) / 360
+    y = (1 - np.log(np.tan(lat) + 1 / np.cos(lat)) / np.pi) / 2
+    return x, y
+
+
+def inverse_mercator(x, y):
+    """(latitude, longitude) of normalized Web Mercator coordinates."""
+    latitude = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * np.asarray(y)))))
+    longitude = np.asarray(x) * 360 - 180
+    return latitude, longitude
+
+
+def viewport(center_lat, center_lon, zoom, width_px, height_px):
+    """(south, west, north, east) visible in a map of the given pixel size."""
+    x, y = mercator(center_lat, center_lon)
+    world_px = TILE_PX * 2 ** zoom
+    half_x, half_y = width_px / 2 / world_px, height_px / 2 / world_px
+
+    north, west = inverse_mercator(x - half_x, max(y - half_y, 0))
+    south, east = inverse_mercator(x + half_x, min(y + half_y, 1))
+    return float(south), float(max(west, -180)), float(north), float(min(east, 180))
+
+
+def fit_view(latitude, longitude, width_px, height_px, padding=0.1):
+    """
+    Center and (integer) zoom that show every point.
+
+    Output:
+    - center_lat, center_lon (float)
+    - zoom (int)
+    """
+    x, y = mercator(latitude, longitude)
+    span_x = (x.max() - x.min()) * (1 + padding)
+    span_y = (y.max() - y.min()) * (1 + padding)
+
+    zooms = [
+        np.log2(size_px / TILE_PX / span)
+        for size_px, span in ((width_px, span_x), (height_px, span_y)) if span > 0
+    ]
+    zoom = int(np.clip(np.floor(min(zooms)), 0, FIT_MAX_ZOOM)) if zooms else FIT_MAX_ZOOM
+
+    center_lat, center_lon = inverse_mercator((x.max() + x.min()) / 2, (y.max() + y.min()) / 2)
+    return float(center_lat), float(center_lon), zoom
+
+
+class GridIndex:
+
+    def __init__(self, latitude, longitude, station_ids):
+        """
+        Input:
+        - latitude, longitude (array): station coordinates in degrees
+        - station_ids (array): station names, same order
+        """
+        self.station_ids = np.asarray(station_ids)
+        self.x, self.y = mercator(latitude, longitude)
+        self._levels = {}
+
+    @classmethod
+    def from_metadata(cls, metadata):
+        return cls(metadata["latitude"], metadata["longitude"], metadata["station_id"])
+
+    def __len__(self):
+        return len(self.station_ids)
+
+    def level(self, zoom):
+        """
+        Cell layout at one zoom level, built on first use.
+
+        Output:
+        - dict: n (cells per axis), order (stations sorted by cell),
+          cells (sorted unique cell ids), starts (first position of each
+          cell in order), centroid x / y per cell
+        """
+        zoom = int(np.clip(zoom, 0, MAX_ZOOM))
+        if zoom in self._levels:
+            return self._levels[zoom]
+
+        n = TILE_PX * 2 ** zoom // CELL_PX
+        ix = np.minimum((self.x * n).astype(np.int64), n - 1)
+        iy = np.minimum((self.y * n).astype(np.int64), n - 1)
+        ids = ix * n + iy
+
+        order = np.argsort(ids, kind="stable")
+        cells, starts = np.unique(ids[order], return_index=True)
+        counts = np.diff(np.append(starts, len(order)))
+
+        level = {
+            "n": n,
+            "order": order,
+            "cells": cells,
+            "starts": starts,
+            "x": np.add.reduceat(self.x[order], starts) / counts,
+            "y": np.add.reduceat(self.y[order], starts) / counts
+        }
+        self._levels[zoom] = level
+        return level
+
+    def visible_cells(self, zoom, view=None):
+        """Positions (into level(zoom)["cells"]) of the cells inside view."""
+        level = self.level(zoom)
+        n, cells = level["n"], level["cells"]
+
+        if view is None:
+            return np.arange(len(cells))
+
+        south, west, north, east = view
+        x0, y0 = mercator(north, west)
+        x1, y1 = mercator(south, east)
+        ix0, ix1 = int(x0 * n), min(int(x1 * n), n - 1)
+        iy0, iy1 = int(y0 * n), min(int(y1 * n), n - 1)
+
+        # Columns ix0..ix1 are one contiguous block of the sorted cell ids
+        first, last = np.searchsorted(cells, [ix0 * n, (ix1 + 1) * n])
+        span = np.arange(first, last)
+
+        iy = cells[span] % n
+        return span[(iy >= iy0) & (iy <= iy1)]
+
+    def aggregate(self, zoom, utilization, peak_forecast, view=None):
+        """
+        One row per visible cell.
+
+        Input:
+        - zoom (int): map zoom
+        - utilization, peak_forecast (array): per station, index order;
+          NaN for stations without a forecast
+        - view (tuple): (south, west, north, east), None for the whole fleet
+
+        Output:
+        - cells (DataFrame): latitude, longitude (station centroid), count,
+          utilization (max), peak_forecast (sum), station and station_index
+          (worst station)
+        """
+        level = self.level(zoom)
+        visible = self.visible_cells(zoom, view)
+
+        if len(visible) == 0:
+            return pd.DataFrame(columns=[
+                "latitude", "longitude", "count", "utilization", "peak_forecast", "station", "station_index"
+            ])
+
+        starts = level["starts"]
+        ends = np.append(starts[1:], len(level["order"]))
+        counts = ends[visible] - starts[visible]
+        offsets = np.append(0, np.cumsum(counts)[:-1])
+
+        # Stations of the visible cells, grouped by cell
+        positions = np.repeat(starts[visible] - offsets, counts) + np.arange(counts.sum())
+        members = level["order"][positions]
+
+        cell_utilization = np.asarray(utilization, dtype=float)[members]
+        cell_peak = np.asarray(peak_forecast, dtype=float)[members]
+
+        max_utilization = np.fmax.reduceat(cell_utilization, offsets)
+        total_peak = np.add.reduceat(np.nan_to_num(cell_peak), offsets)
+
+        # Worst station: first member matching its cell's max (NaN-safe)
+        cell_of_member = np.repeat(np.arange(len(visible)), counts)
+        is_worst = (cell_utilization == max_utilization[cell_of_member]) | np.isnan(max_utilization[cell_of_member])
+        worst_cell, worst_pos = np.unique(cell_of_member[is_worst], return_index=True)
+        worst = np.empty(len(visible), dtype=members.dtype)
+        worst[worst_cell] = members[np.flatnonzero(is_worst)[worst_pos]]
+
+        latitude, longitude = inverse_mercator(level["x"][visible], level["y"][visible])
+
+        return pd.DataFrame({
+            "latitude": latitude,
+            "longitude": longitude,
+            "count": counts,
+            "utilization": max_utilization,
+            "peak_forecast": total_peak,
+            "station": self.station_ids[worst],
+            "station_index": worst
+        })
@@ -0,0 +1,42 @@
+"""
+Tabular output helpers shared by the command-line tools.
+"""
+import os
+
+import pandas as pd
+
+FORMATS = {".parquet", ".csv"}
+
+
+def check_output_path(path):
+    """Raise ValueError early for an unsupported output format."""
+    extension = os.path.splitext(path)[1].lower()
+
+    if extension not in FORMATS:
+        raise ValueError(f"Unsupported output format '{extension}', use one of {sorted(FORMATS)}")
+
+    if extension == ".parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ValueError("Writing .parquet requires pyarrow (pip install pyarrow)")
+
+
+def write_table(frame, path):
+    """Write frame to .parquet or .csv, chosen by extension."""
+    check_output_path(path)
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    if path.lower().endswith(".parquet"):
+        frame.to_parquet(path, index=False)
+    else:
+        frame.to_csv(path, index=False)
+
+
+def read_table(path):
+    if path.lower().endswith(".parquet"):
+        return pd.read_parquet(path)
+    return pd.read_csv(path)